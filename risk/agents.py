@@ -1,4 +1,3 @@
-import random
 import logging
 from typing import Tuple, List, Dict, Any, TYPE_CHECKING
 
@@ -6,6 +5,7 @@ from risk.rules import attack
 import risk.heuristic as heuristic
 from risk.player import Player
 from risk.cards import Card
+from risk.transposition import TranspositionTable
 
 if TYPE_CHECKING:
     from risk.board import World, Territory
@@ -113,8 +113,8 @@ class Passive(Player):
 
     def deploy(self, map: 'World', armies: int):
         """passive deployts to the first territory with the least troops"""
-        own = sorted((
-            territory for territory in map.territories if territory.owner == self),
+        own = sorted(
+            map.owned_territories(self),
             key=lambda t: t.id + len(map.territories) * t.armies)
         map.add_armies(own[0], armies)
 
@@ -157,12 +157,9 @@ class Standard(Player):
 
     def deploy(self, map: 'World', armies: int) -> None:
         """The player deployment logic"""
-        own = [
-            territory for territory in map.territories
-            if territory.owner == self and any(
-                n for n in map.get_neighbours(territory) if n.owner != self)]
+        own = map.border_territories(self)
         assert len(own) > 0
-        map.add_armies(own[random.randint(0, len(own)) - 1], armies)
+        map.add_armies(own[map.agent_dice.randint(0, len(own)) - 1], armies)
 
     def take_card(self, card: 'Card') -> None:
         """Add card to the players hand"""
@@ -171,8 +168,8 @@ class Standard(Player):
     def attacks(self, map: 'World', options: Dict[str, Any]) -> List:
         """Declare list of attacks"""
         attacks = []
-        for territory in map.territories:
-            if territory.owner is self and territory.armies > 1:
+        for territory in map.border_territories(self):
+            if territory.armies > 1:
                 for neighbour in map.get_neighbours(territory):
                     if neighbour.owner is not self:
                         attacks.append((territory, neighbour))
@@ -209,10 +206,8 @@ class Aggresive(Player):
 
     def deploy(self, map, armies):
         """Aggressive blobs as much as possible, in territories with a border"""
-        own = sorted((
-            territory for territory in map.territories
-            if territory.owner == self and any(
-                n.owner != self for n in map.get_neighbours(territory))),
+        own = sorted(
+            map.border_territories(self),
             key=lambda t: t.id + len(map.territories) * t.armies, reverse=True)
         map.add_armies(own[0], armies)
 
@@ -223,8 +218,8 @@ class Aggresive(Player):
     def attacks(self, map, options):
         """Declare list of attacks"""
         options = [
-            (territory, neighbour) for territory in map.territories
-            if territory.owner is self and territory.armies > 1
+            (territory, neighbour) for territory in map.border_territories(self)
+            if territory.armies > 1
             for neighbour in map.get_neighbours(territory)
             if neighbour.owner is not self and territory.armies - 1 > neighbour.armies]
         attacks = sorted(
@@ -264,8 +259,8 @@ class Pacifist(Player):
 
     def deploy(self, map, armies):
         """Passive deployts to the first territory with the least troops"""
-        own = sorted((
-            territory for territory in map.territories if territory.owner == self),
+        own = sorted(
+            map.owned_territories(self),
             key=lambda t: t.id + len(map.territories) * t.armies)
         map.add_armies(own[0], armies)
 
@@ -276,8 +271,8 @@ class Pacifist(Player):
     def attacks(self, map, options):
         """Attacks 1 target with least armies"""
         options = [
-            (territory, neighbour) for territory in map.territories
-            if territory.owner is self and territory.armies > 1
+            (territory, neighbour) for territory in map.border_territories(self)
+            if territory.armies > 1
             for neighbour in map.get_neighbours(territory)
             if neighbour.owner is not self and territory.armies - 1 > neighbour.armies]
         attacks = sorted(options, key=lambda path: path[1].armies)
@@ -299,6 +294,7 @@ class Greedy(Player):
     """Plays the imediate best move"""
     def __init__(self, index, name):
         super().__init__(index, name)
+        self.table = TranspositionTable()
 
     def __repr__(self):
         return super().__repr__()
@@ -314,31 +310,24 @@ class Greedy(Player):
         return basic_check_cards(self, map)
 
     def _trial_deployment(self, map, armies):
-        sandbox = map.make_copy()
-
         def test(territory):
-            sandbox.add_armies(sandbox.get_territory(territory.name), armies)
-            value = heuristic.heuristic(sandbox, self)
-            sandbox.remove_armies(sandbox.get_territory(territory.name), armies)
-            return value
+            with map.sandbox():
+                map.add_armies(territory, armies)
+                return heuristic.cached_heuristic(map, self, self.table)
         return test
 
     def _trial_attacks(self, map, options):
-        sandbox = map.make_copy()
-
         def test(args):
             territory_from, territory_to = args
-            prior_from, prior_to = territory_from.armies, territory_to.armies
-            attack(map, self, options, territory_from, territory_to)
-            value = heuristic.heuristic(sandbox, self)
-            territory_from.armies, territory_to.armies = prior_from, prior_to
-            return value
+            with map.sandbox():
+                attack(map, self, options, territory_from, territory_to)
+                return heuristic.cached_heuristic(map, self, self.table)
         return test
 
     def deploy(self, map, armies):
         """Deploy to minimise heuristic"""
-        own = sorted((
-            territory for territory in map.territories if territory.owner == self),
+        own = sorted(
+            map.owned_territories(self),
             key=self._trial_deployment(map, armies))
         map.add_armies(own[0], armies)
 
@@ -349,8 +338,8 @@ class Greedy(Player):
     def attacks(self, map, options):
         """Attacks 1 target with the best heurstic"""
         valid = [
-            (territory, neighbour) for territory in map.territories
-            if territory.owner is self and territory.armies > 1
+            (territory, neighbour) for territory in map.border_territories(self)
+            if territory.armies > 1
             for neighbour in map.get_neighbours(territory)
             if neighbour.owner is not self and territory.armies - 1 > neighbour.armies]
         attacks = sorted(valid, key=self._trial_attacks(map, options))
@@ -368,9 +357,20 @@ class Greedy(Player):
         return territory_from.armies - 1
 
 
+AGENTS = {
+    'Passive': Passive,
+    'Standard': Standard,
+    'Aggresive': Aggresive,
+    'Pacifist': Pacifist,
+    'Greedy': Greedy,
+}  # type: Dict[str, Any]
+
+
 def make_players(options):
-    assert options['players'] >= 2
+    """Players for each seat, the agents option names the agent in each seat"""
+    agents = options.get('agents') or ['Standard'] * options['players']
+    assert len(agents) >= 2
     players = []
-    for i in range(options['players']):
-        players.append(Standard(i, "Standard {}".format(i)))
+    for i, agent in enumerate(agents):
+        players.append(AGENTS[agent](i, "{} {}".format(agent, i)))
     return players
@@ -1,15 +1,14 @@
-from typing import Callable, Any, Tuple, Dict, List
+from typing import Callable, Any, Tuple, Dict, List, Optional, Union, cast
 from itertools import product, chain
 from functools import lru_cache
-import warnings
+import glob
 import logging
+import math
+import os
+import tempfile
 import numpy as np
 
-from scipy.sparse import csc_matrix
-from scipy.sparse import identity
-from scipy.sparse.linalg import inv
-
-warnings.filterwarnings('ignore')  # scipy generates tons of errors
+from risk.dice import Dice, GLOBAL_DICE
 
 # Battle Estimator
 #
@@ -18,6 +17,22 @@ warnings.filterwarnings('ignore')  # scipy generates tons of errors
 # attacker or defender winning, as well as the expected number of survivors
 # and even the range of likely outcomes.
 # This allows an A.I. to consider only likely outcomes
+#
+# Armies only ever go down so the chain has no cycles, instead of inverting
+# the transition matrix the outcome distribution of every battle is built up
+# from the smaller battles it can turn into, fewest armies first.
+#
+# Tables can be saved to a directory and memory mapped back in, so separate
+# runs and processes share one page cached copy instead of each building it.
+#
+# A table's memory is cubic in its size, so a battle too big for a table under
+# MAX_TABLE_BYTES is solved on its own, carrying the probability of each state
+# forward from the start instead of tabulating every smaller battle.
+
+TABLE_VERSION = 3  # bump when the saved table layout changes
+ATTACK_DICE = 3
+DEFEND_DICE = 2
+MAX_TABLE_BYTES = 1 << 26  # largest outcome table a cache grows to, beyond it battles are solved one at a time
 
 
 def probY(y1: int, y2: int = None) -> float:
@@ -111,104 +126,276 @@ def generate_states(A: int, D: int)\
     return transient_state, absorbing_state
 
 
+@lru_cache()
+def round_losses() -> np.ndarray:
+    """Probability of the defender losing k armies in a round, indexed by
+    [attacking dice, defending dice, k]"""
+    losses = np.zeros((4, 3, 3))
+    for attackers, defenders, defender_loses in product(range(1, 4), range(1, 3), range(3)):
+        losses[attackers, defenders, defender_loses] = probable_outcome(attackers, defenders, defender_loses)
+    losses.setflags(write=False)
+    return losses
+
+
+def outcome_states(A: int, D: int) -> np.ndarray:
+    """Every end of battle state up to A attackers and D defenders, ordered
+    (0, D) .. (0, 1), (1, 0) .. (A, 0) so the outcomes of a battle of a
+    attackers and d defenders are the contiguous slice [D - d, D + a)"""
+    states = np.zeros((D + A, 2), dtype=np.int32)
+    states[:D, 1] = np.arange(D, 0, -1)
+    states[D:, 0] = np.arange(1, A + 1)
+    return states
+
+
+def generate_outcome_table(A: int, D: int, previous: Optional[np.ndarray] = None) -> np.ndarray:
+    """Outcome distribution of every battle up to A attackers and D defenders,
+    table[a, d] holds the probability of each state in outcome_states(A, D).
+    Battles already in previous, a smaller table, are copied over rather than solved again"""
+    table = np.zeros((A + 1, D + 1, D + A))
+    table[0, 1:, :D] = np.fliplr(np.eye(D))  # (0, y) is outcome D - y
+    table[1:, 0, D:] = np.eye(A)  # (x, 0) is outcome D + x - 1
+    solved_a, solved_d = 0, 0
+    if previous is not None:
+        solved_a, solved_d = previous.shape[0] - 1, previous.shape[1] - 1
+        assert solved_a <= A and solved_d <= D
+        table[:solved_a + 1, :solved_d + 1, D - solved_d:D + solved_a] = previous
+    losses = round_losses()
+    for armies in range(2, A + D + 1):
+        a = np.arange(max(1, armies - D), min(A, armies - 1) + 1)
+        d = armies - a
+        unsolved = (a > solved_a) | (d > solved_d)
+        if not unsolved.any():
+            continue
+        a, d = a[unsolved], d[unsolved]
+        deaths = np.where((a > 1) & (d > 1), 2, 1)
+        a_dice, d_dice = np.minimum(a, ATTACK_DICE), np.minimum(d, DEFEND_DICE)
+        outcome = np.zeros((len(a), D + A))
+        for defender_loses in range(3):
+            attacker_loses = deaths - defender_loses
+            possible = attacker_loses >= 0
+            p = np.where(possible, losses[a_dice, d_dice, defender_loses], 0)
+            na = np.where(possible, a - attacker_loses, a)
+            nd = np.where(possible, d - defender_loses, d)
+            outcome += p[:, None] * table[na, nd]
+        table[a, d] = outcome
+    return table
+
+
+def table_bytes(A: int, D: int) -> int:
+    """Memory taken by the outcome table of every battle up to A attackers and D defenders"""
+    return (A + 1) * (D + 1) * (D + A) * np.dtype(float).itemsize
+
+
+@lru_cache(maxsize=1024)
+def solve_battle(a: int, d: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Outcome states of a single battle and their probabilities, in the order of
+    outcome_states(a, d), found by pushing the chance of reaching each state on to
+    the states it can turn into, most armies first, in memory linear in the states"""
+    reach = np.zeros((a + 1, d + 1))
+    reach[a, d] = 1
+    losses = round_losses()
+    for armies in range(a + d, 1, -1):
+        x = np.arange(max(1, armies - d), min(a, armies - 1) + 1)
+        y = armies - x
+        deaths = np.where((x > 1) & (y > 1), 2, 1)
+        x_dice, y_dice = np.minimum(x, ATTACK_DICE), np.minimum(y, DEFEND_DICE)
+        for defender_loses in range(3):
+            attacker_loses = deaths - defender_loses
+            possible = attacker_loses >= 0
+            p = losses[x_dice, y_dice, defender_loses] * reach[x, y]
+            reach[x[possible] - attacker_loses[possible], y[possible] - defender_loses] += p[possible]
+    probs = np.concatenate((reach[0, d:0:-1], reach[1:, 0]))
+    states = outcome_states(a, d)
+    probs.setflags(write=False)
+    states.setflags(write=False)
+    return states, probs
+
+
 def generate_prob_matrix(A: int, D: int)\
         -> Tuple[Dict[Tuple[int, int], int], Dict[Tuple[int, int], int], np.ndarray]:
     """Generate the probability outcome matrix"""
     transient_state, absorbing_state = generate_states(A, D)
     transient_state_lookup = {s: i for i, s in enumerate(transient_state)}
     absorbing_state_lookup = {s: i for i, s in enumerate(absorbing_state)}
-    transient_length, absorbing_length = len(transient_state), len(absorbing_state)
-    # Add probability to transition elements
-    Qrow = []
-    Qcol = []
-    Qdata = []
-    Rrow = []
-    Rcol = []
-    Rdata = []
-    for i, (a, d) in enumerate(transient_state):
-        max_deaths = 2 if a > 1 and d > 1 else 1
-        for dl in range(0, max_deaths + 1):
-            al = max_deaths - dl
-            na, nd = a - al, d - dl
-            if a - al > 0 and d - dl > 0:
-                Qrow.append(i)
-                Qcol.append(transient_state_lookup[(na, nd)])
-                Qdata.append(probable_outcome(min(a, 3), min(d, 2), dl))
-            else:
-                Rrow.append(i)
-                Rcol.append(absorbing_state_lookup[(na, nd)])
-                Rdata.append(probable_outcome(min(a, 3), min(d, 2), dl))
-    Q = csc_matrix((Qdata, (Qrow, Qcol)), shape=(transient_length, transient_length))
-    R = csc_matrix((Rdata, (Rrow, Rcol)), shape=(transient_length, absorbing_length))
-    iden = identity(transient_length)
-    F = inv(iden - Q) * R
+    table = generate_outcome_table(A, D)
+    table_order = [D - d for _, d in absorbing_state[:D]] + [D + a - 1 for a, _ in absorbing_state[D:]]
+    F = table[tuple(zip(*transient_state))][:, table_order]
     return transient_state_lookup, absorbing_state_lookup, F
 
 
-def filter_states(states: Dict[Tuple[int, int], int], probs: np.ndarray, a: int, d: int)\
-        -> Tuple[List[Tuple[int, int]], np.ndarray]:
-    """Filter invalid states"""
-    reverse_states = {y: x for x, y in states.items()}
-    new_states, new_probs = tuple(
-        zip(*((s, p) for s, p in list((reverse_states[i], prob)
-            for i, prob in enumerate(probs)) if s[0] <= a or s[1] <= d)))
-    return new_states, new_probs
-
-
-def get_matrix_row(F: np.ndarray, row: int) -> np.ndarray:
-    """Gets the ith row of the matrix
-    needed for getting probabilities of outcomes from starting state i"""
-    if len(F.shape) > 1:
-        return F[row][:].toarray()[0]
-    else:
-        return F
+def table_path(directory: str, size: Union[Tuple[int, int], str]) -> str:
+    """File for a saved outcome table of size attackers and defenders, named by version and dice rules"""
+    name = size if isinstance(size, str) else "{}x{}".format(*size)
+    return os.path.join(directory, "battle-v{}-{}v{}-{}.npy".format(
+        TABLE_VERSION, ATTACK_DICE, DEFEND_DICE, name))
+
+
+def save_outcome_table(directory: str, table: np.ndarray) -> str:
+    """Save an outcome table, written to a temporary file first so processes
+    loading at the same time never see part of a table, and remove the saved
+    tables it covers"""
+    os.makedirs(directory, exist_ok=True)
+    A, D = table.shape[0] - 1, table.shape[1] - 1
+    path = table_path(directory, (A, D))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.npy')
+    with os.fdopen(handle, 'wb') as f:
+        np.save(f, table)
+    os.replace(temporary, path)
+    for a, d in saved_table_sizes(directory):
+        if a <= A and d <= D and (a, d) != (A, D):
+            try:
+                os.remove(table_path(directory, (a, d)))
+            except OSError:
+                pass  # already removed by another process, or mapped where that is not allowed
+    return path
+
+
+def saved_table_sizes(directory: str) -> List[Tuple[int, int]]:
+    """Attackers and defenders of the tables saved in directory for this version and dice rules"""
+    head = table_path(directory, '')[:-len('.npy')]
+    sizes = [path[len(head):-len('.npy')].split('x') for path in glob.glob(table_path(directory, '*x*'))]
+    return sorted((int(a), int(d)) for a, d in sizes)
+
+
+def load_outcome_table(directory: str, attackers: int, defenders: int) -> Optional[np.ndarray]:
+    """Memory map the smallest saved table covering a battle of attackers and defenders, if there is one"""
+    sizes = [(a, d) for a, d in saved_table_sizes(directory) if a >= attackers and d >= defenders]
+    if not sizes:
+        return None
+    smallest = min(sizes, key=lambda size: table_bytes(*size))
+    return cast(np.ndarray, np.load(table_path(directory, smallest), mmap_mode='r'))
+
+
+def alias_table(probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Walker's alias table, column i is kept with probability accept[i]
+    and otherwise swapped for alias[i] so each sample is constant time"""
+    n = len(probs)
+    scaled = np.asarray(probs, dtype=float) * n / np.sum(probs)
+    accept = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        accept[less], alias[less] = scaled[less], more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    accept.setflags(write=False)
+    alias.setflags(write=False)
+    return accept, alias
+
+
+class OutcomeCache:
+    """Outcome table for battles seen so far, the attacker and defender sides each
+    grown geometrically when a bigger battle comes along so only the new start
+    states need solving. Battles that would take the table past max_bytes are
+    solved one at a time instead"""
+    def __init__(
+            self, directory: Optional[str] = None, growth: float = 2.0, prewarm: int = 0,
+            max_bytes: int = MAX_TABLE_BYTES) -> None:
+        assert growth > 1
+        self.directory = directory
+        self.growth = growth
+        self.max_bytes = max_bytes
+        self.table = np.zeros((1, 1, 0))
+        self.states = outcome_states(0, 0)
+        self.samplers = {}  # type: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]
+        self.hits = 0
+        self.grows = 0
+        self.loads = 0
+        self.solves = 0  # battles solved on their own, too big for the table
+        if prewarm:
+            self.prewarm(prewarm)
+
+    def __call__(self, a: int, d: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Read only views of the outcome states of a battle and their probabilities,
+        defender wins with the most defenders left first then attacker wins"""
+        A, D = self.attackers, self.defenders
+        if a > A or d > D:
+            A = max(a, math.ceil(A * self.growth)) if a > A else A
+            D = max(d, math.ceil(D * self.growth)) if d > D else D
+            if table_bytes(A, D) > self.max_bytes:
+                self.solves += 1
+                return solve_battle(a, d)
+            self.grow(A, D)
+        else:
+            self.hits += 1
+        start, end = self.defenders - d, self.defenders + a
+        return self.states[start:end], self.table[a, d, start:end]
+
+    def sampler(self, a: int, d: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Alias table for the outcomes of a battle, built on first use"""
+        if (a, d) not in self.samplers:
+            self.samplers[(a, d)] = alias_table(self(a, d)[1])
+        return self.samplers[(a, d)]
+
+    @property
+    def attackers(self) -> int:
+        """Most attackers the table covers"""
+        return int(self.table.shape[0] - 1)
+
+    @property
+    def defenders(self) -> int:
+        """Most defenders the table covers"""
+        return int(self.table.shape[1] - 1)
+
+    def prewarm(self, size: int) -> None:
+        """Solve every battle up to size armies a side ahead of time"""
+        if size > self.attackers or size > self.defenders:
+            self.grow(max(size, self.attackers), max(size, self.defenders))
+
+    def grow(self, A: int, D: int) -> None:
+        """Extend the table to cover A attackers and D defenders, from disk if a big enough table is saved"""
+        saved = load_outcome_table(self.directory, A, D) if self.directory else None
+        if saved is not None:
+            self.loads += 1
+            self.table = saved
+        else:
+            logging.info("Growing battle outcomes from {}x{} to {}x{}".format(self.attackers, self.defenders, A, D))
+            self.grows += 1
+            self.table = generate_outcome_table(A, D, self.table if self.table.size else None)
+            self.table.setflags(write=False)
+            if self.directory:
+                save_outcome_table(self.directory, self.table)
+        self.states = outcome_states(self.attackers, self.defenders)
+        self.states.setflags(write=False)
 
 
-def wrap_probabilities()\
-        -> Callable[[int, int], Tuple[List[Tuple[int, int]], np.ndarray]]:
-    """Avoids generating probability matrix if a larger one already exists"""
-    F = []  # type: List[List[int]]
-    transient_state_lookup = {}  # type: Dict[Tuple[int, int], int]
-    absorbing_state_lookup = {}  # type: Dict[Tuple[int, int], int]
-
-    def get_prob(a: int, d: int) -> Tuple[List[Tuple[int, int]], np.ndarray]:
-        nonlocal F, transient_state_lookup, absorbing_state_lookup
-        if (a, d) in transient_state_lookup.keys():
-            return filter_states(
-                absorbing_state_lookup, get_matrix_row(F, transient_state_lookup[(a, d)]), a, d)
-        else:
-            logging.critical("State outcomes not calculated for ({},{})".format(a, d))
-            b = max(a, d)  # avoid shrinking the matrix
-            transient_state_lookup, absorbing_state_lookup, F = generate_prob_matrix(b, b)
-            logging.critical("Calculated")
-            # need the lookup for where
-            return filter_states(
-                absorbing_state_lookup, get_matrix_row(F, transient_state_lookup[(a, d)]), a, d)
-    return get_prob
+def wrap_probabilities(directory: Optional[str] = None)\
+        -> Callable[[int, int], Tuple[np.ndarray, np.ndarray]]:
+    """Avoids generating the outcome table if a larger one already exists,
+    in memory or saved in directory"""
+    return OutcomeCache(directory)
 
 
 # Need a smarter way of doing this?
-get_cached_probabilities = wrap_probabilities()
+get_cached_probabilities = OutcomeCache(os.environ.get('RISK_BATTLE_TABLES'))
 
 
 @lru_cache()
 def calculate_win_prob(a: int, d: int) -> float:
     _, probs = get_cached_probabilities(a, d)
-    return sum(probs[d:])
+    return float(probs[d:].sum())
 
 
 @lru_cache()
 def calculate_expected_remainder(a: int, d: int) -> Tuple[float, float, float, float]:
     """Calculated Expectations and Standard Deviations from a Battle"""
     states, probs = get_cached_probabilities(a, d)
-    ea = sum(a * p for (a, d), p in zip(states, probs))
-    ed = sum(d * p for (a, d), p in zip(states, probs))
-    va = sum(p * pow(a - ea, 2) for (a, d), p in zip(states, probs))
-    vd = sum(p * pow(d - ed, 2) for (a, d), p in zip(states, probs))
-    return ea, va, ed, vd
+    ea, ed = probs @ states
+    va, vd = probs @ (states - (ea, ed)) ** 2
+    return float(ea), float(va), float(ed), float(vd)
+
 
+def sample_outcomes(a: int, d: int, repeats: int = 1, dice: Dice = GLOBAL_DICE) -> np.ndarray:
+    """Outcomes of many battles of a attackers and d defenders as a repeats x 2 array"""
+    states, _ = get_cached_probabilities(a, d)
+    accept, alias = get_cached_probabilities.sampler(a, d)
+    u = dice.random(repeats) * len(states)
+    column = u.astype(np.intp)
+    return states[np.where(u - column < accept[column], column, alias[column])]
 
-def generate_outcome(a: int, d: int, repeats: int = 1) -> List[Tuple[int, int]]:
+
+def generate_outcome(a: int, d: int, repeats: int = 1, dice: Dice = GLOBAL_DICE) -> List[Tuple[int, int]]:
     """Run a battle using the matrix instead of simulated dice"""
-    states, probs = get_cached_probabilities(a, d)
-    return [states[x] for x in np.random.choice(range(len(states)), repeats, p=probs)]
+    return [(a, d) for a, d in sample_outcomes(a, d, repeats, dice).tolist()]
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+import risk.agents as agents
+import risk.board as board
+import risk.heuristic as heuristic
+import risk.rules as rules
+from risk.battle_estimator import generate_outcome_table, get_cached_probabilities
+from risk.dice import DiceStream
+from risk.risk import options as default_options, risk
+
+# Benchmarks
+#
+# Each metric is either a rate, named *_per_second, or a time, named *_seconds,
+# with what was measured in brackets after the name.
+# Results are saved as JSON baselines named by a tag for the machine they were
+# measured on, and a run fails when a metric is worse than the baseline from
+# the same machine by more than the threshold.
+
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+THRESHOLD = 0.2  # fraction a metric may worsen by before it counts as a regression
+AGENT_MIXES = [['Standard', 'Standard'], ['Greedy', 'Standard'], ['Standard', 'Aggresive', 'Pacifist']]
+TABLE_SIZES = [10, 50, 100, 200]
+DECISION_AGENTS = ['Passive', 'Standard', 'Aggresive', 'Pacifist', 'Greedy']
+
+
+def machine_tag() -> str:
+    """Name for the machine and python the benchmarks are run with"""
+    return "{}-{}-{}cpu-py{}".format(
+        platform.node() or 'unknown', platform.machine(), os.cpu_count(),
+        "".join(platform.python_version_tuple()[:2]))
+
+
+def measure(function: Callable[[], Any], min_time: float = 0.2, repeats: int = 5) -> float:
+    """Best seconds per call of function over repeats, each calling it for at least min_time"""
+    best = float("inf")
+    for _ in range(repeats):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def benchmark_options(**changes: Any) -> Dict[str, Any]:
+    return dict(default_options, plot_gameplay=False, **changes)
+
+
+def midgame(agent_names: List[str], seed: int = 0) -> board.World:
+    """Board dealt out between the agents with a spread of armies"""
+    map = board.make_map(DiceStream(seed))
+    players = agents.make_players({'agents': agent_names})
+    map.allocate_territories(players)
+    for t in map.territories:
+        map.set_armies(t, map.dice.randint(1, 8))
+    return map
+
+
+def games_per_second(agent_names: List[str], games: int = 3) -> float:
+    options = benchmark_options(agents=agent_names, players=len(agent_names))
+
+    def play() -> None:
+        for seed in range(games):
+            risk("benchmark", options, seed)
+    return games / measure(play, min_time=0)
+
+
+def battles_per_second(markov: bool, min_time: float = 0.2) -> float:
+    options = benchmark_options(markov=markov)
+    if markov:
+        get_cached_probabilities.prewarm(50)
+    map = board.make_map(DiceStream(0))
+    attacker, defender = agents.make_players({'agents': ['Standard', 'Standard']})
+    t1, t2 = map.get_territory("Eastern Australia"), map.get_territory("Western Australia")
+    map.set_owner(t1, attacker).set_armies(t1, 12)
+    map.set_owner(t2, defender).set_armies(t2, 8)
+
+    def battle() -> None:
+        with map.sandbox():
+            rules.attack(map, attacker, options, t1, t2)
+    return 1 / measure(battle, min_time)
+
+
+def table_build_seconds(size: int) -> float:
+    return measure(lambda: generate_outcome_table(size, size), min_time=0, repeats=3)
+
+
+def heuristic_per_second(min_time: float = 0.2) -> float:
+    map = midgame(['Standard', 'Standard'])
+    player = map.player_list[0]
+    return 1 / measure(lambda: heuristic.heuristic(map, player), min_time)
+
+
+def decision_seconds(agent_name: str, min_time: float = 0.2) -> float:
+    """Time for an agent to choose its deployment and attacks"""
+    map = midgame([agent_name, 'Standard'])
+    player = map.player_list[0]
+    options = benchmark_options()
+
+    def decide() -> None:
+        if hasattr(player, 'table'):
+            player.table.clear()  # time the search, not the cached answer
+        with map.sandbox():
+            player.deploy(map, 5)
+            player.attacks(map, options)
+    return measure(decide, min_time)
+
+
+def run_benchmarks(
+        mixes: Sequence[List[str]] = AGENT_MIXES, table_sizes: Sequence[int] = TABLE_SIZES,
+        decision_agents: Sequence[str] = DECISION_AGENTS, games: int = 3, min_time: float = 0.2)\
+        -> Dict[str, float]:
+    """Measure every metric"""
+    metrics = {}  # type: Dict[str, float]
+    for mix in mixes:
+        metrics["games_per_second[{}]".format(",".join(mix))] = games_per_second(mix, games)
+    for markov in (False, True):
+        metrics["battles_per_second[{}]".format('markov' if markov else 'dice')] = battles_per_second(
+            markov, min_time)
+    for size in table_sizes:
+        metrics["table_build_seconds[{}]".format(size)] = table_build_seconds(size)
+    metrics["heuristic_per_second"] = heuristic_per_second(min_time)
+    for agent_name in decision_agents:
+        metrics["decision_seconds[{}]".format(agent_name)] = decision_seconds(agent_name, min_time)
+    return metrics
+
+
+def baseline_path(directory: str, tag: str) -> str:
+    return os.path.join(directory, "{}.json".format(tag))
+
+
+def save_baseline(metrics: Dict[str, float], directory: str, tag: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    with open(baseline_path(directory, tag), 'w') as f:
+        json.dump({'machine': tag, 'metrics': metrics}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(directory: str, tag: str) -> Dict[str, float]:
+    """Metrics saved for this machine, empty if there are none"""
+    path = baseline_path(directory, tag)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return dict(json.load(f)['metrics'])
+
+
+def regressions(metrics: Dict[str, float], baseline: Dict[str, float], threshold: float = THRESHOLD) -> List[str]:
+    """Descriptions of the metrics that are worse than the baseline by more than threshold"""
+    found = []
+    for name, value in sorted(metrics.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if name.split('[')[0].endswith('_per_second'):
+            worse = value < base * (1 - threshold)
+        else:
+            worse = value > base * (1 + threshold)
+        if worse:
+            found.append("{}: {:.4g} against a baseline of {:.4g}".format(name, value, base))
+    return found
+
+
+def main(argv: 'Sequence[str]' = sys.argv[1:]) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the game and compare with this machine's baseline")
+    parser.add_argument('--baselines', default=BASELINE_DIRECTORY, help="directory of baselines")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="fraction a metric may worsen by")
+    parser.add_argument('--save', action='store_true', help="save the results as this machine's baseline")
+    args = parser.parse_args(argv)
+    tag = machine_tag()
+    metrics = run_benchmarks()
+    for name, value in sorted(metrics.items()):
+        print("{:45} {:.4g}".format(name, value))
+    if args.save:
+        save_baseline(metrics, args.baselines, tag)
+        return 0
+    found = regressions(metrics, load_baseline(args.baselines, tag), args.threshold)
+    for regression in found:
+        print("REGRESSION {}".format(regression))
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,60 @@
-import logging
 import copy
-import os
-import random
-from typing import List, Tuple, Dict, TYPE_CHECKING, Optional, Any
-from graphviz import Graph
-from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Tuple, Dict, TYPE_CHECKING, Optional, Any, Iterator
+import numpy as np
+
+from risk.dice import GLOBAL_DICE
+from risk.events import EventStream, Conquest, Deploy, Move
+import risk.render as render
+from risk.transposition import MAX_OWNERS, army_bucket, army_key, territory_keys, zobrist_keys
 
 if TYPE_CHECKING:
     from typing import Set
+    from risk.dice import Dice
     from risk.player import Player
 
 
+NO_OWNER = -1  # owner id of a territory nobody holds
+OWNER_CHANGE = 0  # journal entry kinds
+ARMY_CHANGE = 1
+
+
 class World:
-    def __init__(self):
+    """The board, ownership and armies are stored as compact arrays indexed by
+    territory and the Territory objects are views onto them"""
+    def __init__(self, dice: 'Optional[Dice]' = None) -> None:
+        self.dice = dice or GLOBAL_DICE  # type: Dice  # combat
+        self.deal_dice = self.dice  # territories and cards
+        self.agent_dice = self.dice  # agents' choices and their trial battles
+        self.events = EventStream()
         self.territories = []  # type: List[Territory]
         self.territories_by_name = {}  # type: Dict[str, Territory]
         self.continent_values = {}  # type: Dict[str, int]
+        self.continent_index = {}  # type: Dict[str, int]
         self.players = set()  # type: Set[Player]
-        self.player_territory_count = defaultdict(lambda: 0)  # type: Dict[Player, int]
+        self.player_ids = {}  # type: Dict[Player, int]
+        self.player_list = []  # type: List[Player]
+        self.owner_ids = np.zeros(0, dtype=np.int16)  # type: np.ndarray
+        self.army_counts = np.zeros(0, dtype=np.int32)  # type: np.ndarray
+        self.continent_ids = np.zeros(0, dtype=np.int16)  # type: np.ndarray
+        # per continent: size, bonus, territories held by each player and who holds all of it
+        self.continent_sizes = np.zeros(0, dtype=np.int32)  # type: np.ndarray
+        self.continent_bonus = np.zeros(0, dtype=np.int32)  # type: np.ndarray
+        self.continent_counts = np.zeros((0, 0), dtype=np.int32)  # type: np.ndarray
+        self.continent_holders = np.zeros(0, dtype=np.int16)  # type: np.ndarray
+        self._adjacency = None  # type: Optional[Tuple[np.ndarray, np.ndarray]]
+        self._neighbour_ids = None  # type: Optional[List[Tuple[int, ...]]]
+        self._incoming_ids = None  # type: Optional[List[Tuple[int, ...]]]
+        self._neighbours = None  # type: Optional[List[Tuple[Territory, ...]]]
+        # per player: territories owned and owned territories with a foreign neighbour
+        self._owned = []  # type: List[Set[int]]
+        self._borders = []  # type: List[Set[int]]
+        self._foreign_neighbours = None  # type: Optional[np.ndarray]
+        self._journal = None  # type: Optional[List[Tuple[int, int, int]]]
+        self._checkpoints = 0  # checkpoints not yet rolled back or committed
+        self._sandboxes = 0  # sandboxes open
+        self._zobrist = None  # type: Optional[int]
+        self._army_hash = 0  # exact army counts, kept with _zobrist
 
     def __repr__(self) -> str:
         return "\n".join("{}: {} armies owned by {}".format(
@@ -25,29 +62,52 @@ class World:
             for territory in self.territories)
 
     def make_copy(self) -> 'World':
-        return copy.deepcopy(self)
+        """Copy the board state, the map layout is shared with the original"""
+        clone = copy.copy(self)
+        clone.owner_ids = self.owner_ids.copy()
+        clone.army_counts = self.army_counts.copy()
+        clone.continent_counts = self.continent_counts.copy()
+        clone.continent_holders = self.continent_holders.copy()
+        clone._journal = None
+        clone._checkpoints = 0
+        clone._sandboxes = 0
+        clone.events = EventStream()
+        clone._neighbours = None
+        clone._owned = [set(owned) for owned in self._owned]
+        clone._borders = [set(border) for border in self._borders]
+        if self._foreign_neighbours is not None:
+            clone._foreign_neighbours = self._foreign_neighbours.copy()
+        clone.players = set(self.players)
+        clone.player_ids = dict(self.player_ids)
+        clone.player_list = list(self.player_list)
+        clone.territories = [territory.view(clone) for territory in self.territories]
+        clone.territories_by_name = {territory.name: territory for territory in clone.territories}
+        return clone
 
     def make_graph(self, name: str, description: str) -> None:
-        g = Graph('World', filename='world.gv', engine='neato')
-        g.attr(label=description)
-        g.attr('node', colorscheme="pastel19", style="filled")
-        for t in self.territories:
-            assert t.owner
-            g.node(t.name, "{} ({:4d})".format(t.name, t.armies),
-                   fillcolor=str(t.owner.index + 1), pos=t.get_coordinates())
-            for i in t.connections:
-                g.edge(t.name, self.territories[i - 1].name)
-        g.format = 'svg'
-        g.render('outputs/{}'.format(name), view=False)
-        if os.path.exists('outputs/{}'.format(name)):
-            os.remove('outputs/{}'.format(name))
+        """Draw the board now, see risk.render for drawing in the background"""
+        render.render_snapshot(render.layout(self), render.snapshot(self, name, description))
 
     def make_territory(
             self, id: int, name: str, continent: str,
             coordinates: Tuple[float, float], connections: List[int]):
-        territory = Territory(id, name, continent, coordinates, connections)  # type: Territory
+        territory = Territory(
+            id, name, continent, coordinates, connections,
+            world=self, index=len(self.territories))  # type: Territory
         self.territories.append(territory)
         self.territories_by_name[name] = territory
+        continent_id = self.register_continent(continent)
+        self.owner_ids = np.append(self.owner_ids, np.int16(NO_OWNER))
+        self.army_counts = np.append(self.army_counts, np.int32(0))
+        self.continent_ids = np.append(self.continent_ids, np.int16(continent_id))
+        self.continent_sizes[continent_id] += 1
+        self.continent_holders[continent_id] = NO_OWNER
+        self._adjacency = None
+        self._neighbour_ids = None
+        self._incoming_ids = None
+        self._neighbours = None
+        self._foreign_neighbours = None
+        self._zobrist = None
 
     def get_territory(self, name: str) -> 'Territory':
         return self.territories_by_name[name]
@@ -59,90 +119,317 @@ class World:
         while len(territories_to_be_allocated) > 0:
             for player in players:
                 # pop a random remaining territory
-                t = random.choice(sorted(list(territories_to_be_allocated)))
+                t = self.deal_dice.choice(sorted(list(territories_to_be_allocated)))
                 territories_to_be_allocated.remove(t)
                 self.set_armies(t, 1)
                 self.set_owner(t, player)
                 if len(territories_to_be_allocated) == 0:
                     break
 
-    def get_neighbours(self, territory: 'Territory') -> 'List[Territory]':
-        return [self.territories[i - 1] for i in territory.connections]
+    def adjacency(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Connections in compressed sparse row form, the neighbours of
+        territory i are indices[indptr[i]:indptr[i + 1]]"""
+        if self._adjacency is None:
+            index_of = {territory.id: territory.index for territory in self.territories}
+            indptr = np.zeros(len(self.territories) + 1, dtype=np.int32)
+            indices = []  # type: List[int]
+            for territory in self.territories:
+                indices.extend(index_of[i] for i in territory.connections)
+                indptr[territory.index + 1] = len(indices)
+            self._adjacency = indptr, np.array(indices, dtype=np.int32)
+        return self._adjacency
+
+    def neighbour_ids(self, index: int) -> Tuple[int, ...]:
+        """Indexes of the territories connected to territory index"""
+        if self._neighbour_ids is None:
+            indptr, indices = self.adjacency()
+            self._neighbour_ids = [
+                tuple(indices[indptr[i]:indptr[i + 1]].tolist()) for i in range(len(self.territories))]
+        return self._neighbour_ids[index]
+
+    def incoming_ids(self, index: int) -> Tuple[int, ...]:
+        """Indexes of the territories with a connection to territory index,
+        these differ from the neighbours where a connection is one way"""
+        if self._incoming_ids is None:
+            incoming = [[] for _ in self.territories]  # type: List[List[int]]
+            for i in range(len(self.territories)):
+                for n in self.neighbour_ids(i):
+                    incoming[n].append(i)
+            self._incoming_ids = [tuple(sources) for sources in incoming]
+        return self._incoming_ids[index]
+
+    def get_neighbours(self, territory: 'Territory') -> 'Tuple[Territory, ...]':
+        if self._neighbours is None:
+            self._neighbours = [
+                tuple(self.territories[i] for i in self.neighbour_ids(t.index)) for t in self.territories]
+        return self._neighbours[territory.index]
+
+    def owned_territories(self, player: 'Player') -> 'List[Territory]':
+        """Territories owned by player in map order"""
+        if player not in self.player_ids:
+            return []
+        return [self.territories[i] for i in sorted(self._owned[self.player_ids[player]])]
+
+    def border_territories(self, player: 'Player') -> 'List[Territory]':
+        """Territories owned by player with a neighbour they do not own, in map order"""
+        if player not in self.player_ids:
+            return []
+        if self._foreign_neighbours is None:
+            self._index_borders()
+        return [self.territories[i] for i in sorted(self._borders[self.player_ids[player]])]
+
+    def _index_borders(self) -> None:
+        """Count the foreign neighbours of every territory from scratch"""
+        indptr, indices = self.adjacency()
+        rows = np.repeat(np.arange(len(self.territories)), np.diff(indptr))
+        foreign = self.owner_ids[rows] != self.owner_ids[indices]
+        self._foreign_neighbours = np.bincount(
+            rows, weights=foreign, minlength=len(self.territories)).astype(np.int32)
+        self._borders = [set() for _ in self.player_list]
+        for i in np.flatnonzero(self._foreign_neighbours).tolist():
+            owner_id = self.owner_ids.item(i)
+            if owner_id != NO_OWNER:
+                self._borders[owner_id].add(i)
 
     def set_continent_army_value(self, name: str, value: int) -> None:
         self.continent_values[name] = value
+        continent_id = self.register_continent(name)
+        self.continent_bonus[continent_id] = value
+
+    def register_continent(self, name: str) -> int:
+        """Get the id of continent name, adding it to the continent index if new"""
+        if name not in self.continent_index:
+            self.continent_index[name] = len(self.continent_index)
+            self.continent_sizes = np.append(self.continent_sizes, np.int32(0))
+            self.continent_bonus = np.append(self.continent_bonus, np.int32(0))
+            self.continent_holders = np.append(self.continent_holders, np.int16(NO_OWNER))
+            self.continent_counts = np.vstack([
+                self.continent_counts, np.zeros((1, len(self.player_list)), dtype=np.int32)])
+        return self.continent_index[name]
+
+    def player_id(self, player: 'Player') -> int:
+        """Get the owner id of player, registering them if new to the board"""
+        if player not in self.player_ids:
+            if len(self.player_list) >= MAX_OWNERS:
+                raise ValueError("A world holds at most {} players".format(MAX_OWNERS))
+            self.player_ids[player] = len(self.player_list)
+            self.player_list.append(player)
+            self._owned.append(set())
+            self._borders.append(set())
+            self.continent_counts = np.hstack([
+                self.continent_counts, np.zeros((len(self.continent_index), 1), dtype=np.int32)])
+        return self.player_ids[player]
+
+    def continent_holder(self, name: str) -> 'Optional[Player]':
+        """Player holding every territory of continent name"""
+        holder = self.continent_holders.item(self.continent_index[name])
+        return self.player_list[holder] if holder != NO_OWNER else None
+
+    def get_owner(self, index: int) -> 'Optional[Player]':
+        """Player owning the territory at index"""
+        owner_id = self.owner_ids.item(index)
+        return self.player_list[owner_id] if owner_id != NO_OWNER else None
 
     def set_owner(self, territory: 'Territory', player: 'Player') -> 'World':
-        if territory.owner:
-            self.player_territory_count[territory.owner] -= 1
-        territory.set_owner(player)
-        self.player_territory_count[player] += 1
+        self._write_owner(territory.index, self.player_id(player))
         return self
 
+    def _write_owner(self, index: int, owner_id: int) -> None:
+        """Change the owner id of territory index keeping the continent index up to date"""
+        previous = self.owner_ids.item(index)
+        if previous == owner_id:
+            return
+        if self._journal is not None:
+            self._journal.append((OWNER_CHANGE, index, previous))
+        if self._zobrist is not None:
+            owner_keys = zobrist_keys(len(self.territories))[0]
+            self._zobrist ^= owner_keys.item(index, previous + 1) ^ owner_keys.item(index, owner_id + 1)
+        continent = self.continent_ids.item(index)
+        self.owner_ids[index] = owner_id
+        if previous != NO_OWNER:
+            self.continent_counts[continent, previous] -= 1
+            if self.continent_holders[continent] == previous:
+                self.continent_holders[continent] = NO_OWNER
+        if owner_id != NO_OWNER:
+            self.continent_counts[continent, owner_id] += 1
+            if self.continent_counts[continent, owner_id] == self.continent_sizes[continent]:
+                self.continent_holders[continent] = owner_id
+            self._owned[owner_id].add(index)
+        if previous != NO_OWNER:
+            self._owned[previous].discard(index)
+        if self._foreign_neighbours is not None:
+            self._update_borders(index, previous, owner_id)
+
+    def _update_borders(self, index: int, previous: int, owner_id: int) -> None:
+        """Update the foreign neighbour counts around territory index after it changed owner"""
+        assert self._foreign_neighbours is not None
+        foreign = sum(self.owner_ids.item(n) != owner_id for n in self.neighbour_ids(index))
+        for n in self.incoming_ids(index):
+            neighbour_owner = self.owner_ids.item(n)
+            change = (neighbour_owner != owner_id) - (neighbour_owner != previous)
+            if change:
+                self._foreign_neighbours[n] += change
+                if neighbour_owner != NO_OWNER:
+                    if self._foreign_neighbours[n]:
+                        self._borders[neighbour_owner].add(n)
+                    else:
+                        self._borders[neighbour_owner].discard(n)
+        self._foreign_neighbours[index] = foreign
+        if previous != NO_OWNER:
+            self._borders[previous].discard(index)
+        if owner_id != NO_OWNER and foreign:
+            self._borders[owner_id].add(index)
+
     def set_armies(self, territory: 'Territory', armies: int) -> 'World':
-        territory.set_armies(armies)
+        assert armies >= 0
+        self._write_armies(territory.index, armies)
         return self
 
+    def _write_armies(self, index: int, armies: int) -> None:
+        previous = self.army_counts.item(index)
+        if self._journal is not None:
+            self._journal.append((ARMY_CHANGE, index, previous))
+        if self._zobrist is not None and previous != armies:
+            old_bucket, new_bucket = army_bucket(previous), army_bucket(armies)
+            if old_bucket != new_bucket:
+                army_keys = zobrist_keys(len(self.territories))[1]
+                self._zobrist ^= army_keys.item(index, old_bucket) ^ army_keys.item(index, new_bucket)
+            key = territory_keys(len(self.territories))[index]
+            self._army_hash ^= army_key(key, previous) ^ army_key(key, armies)
+        self.army_counts[index] = armies
+
+    def zobrist(self, exact: bool = True) -> int:
+        """64 bit Zobrist hash of who owns each territory and how many armies are on it,
+        kept up to date by every change once first asked for. Without exact army counts
+        from EXACT_ARMIES up share buckets, for search keys where close positions may
+        share an entry"""
+        if self._zobrist is None:
+            owner_keys, army_keys = zobrist_keys(len(self.territories))
+            rows = np.arange(len(self.territories))
+            counts = self.army_counts.tolist()
+            buckets = [army_bucket(armies) for armies in counts]
+            self._zobrist = int(
+                np.bitwise_xor.reduce(owner_keys[rows, self.owner_ids + 1], initial=np.uint64(0)) ^
+                np.bitwise_xor.reduce(army_keys[rows, buckets], initial=np.uint64(0)))
+            self._army_hash = 0
+            for key, armies in zip(territory_keys(len(self.territories)), counts):
+                self._army_hash ^= army_key(key, armies)
+        return self._zobrist ^ self._army_hash if exact else self._zobrist
+
+    def checkpoint(self) -> int:
+        """Start journaling changes to the board, returns the mark to roll back to"""
+        if self._journal is None:
+            self._journal = []
+        self._checkpoints += 1
+        return len(self._journal)
+
+    def rollback(self, mark: int) -> None:
+        """Undo every change made since checkpoint mark"""
+        assert self._journal is not None and mark <= len(self._journal)
+        journal, self._journal = self._journal, None
+        while len(journal) > mark:
+            kind, index, previous = journal.pop()
+            if kind == OWNER_CHANGE:
+                self._write_owner(index, previous)
+            else:
+                self._write_armies(index, previous)
+        self._checkpoints -= 1
+        self._journal = journal if self._checkpoints else None
+
+    def commit(self, mark: int) -> None:
+        """Keep the changes made since checkpoint mark"""
+        assert self._journal is not None and mark <= len(self._journal)
+        self._checkpoints -= 1
+        if not self._checkpoints:
+            self._journal = None
+
+    @contextmanager
+    def sandbox(self) -> Iterator['World']:
+        """Try out moves on the board, all changes are rolled back on exit, no
+        events are emitted for them and their battles roll the agents' dice"""
+        mark = self.checkpoint()
+        events, self.events = self.events, EventStream()
+        dice, self.dice = self.dice, self.agent_dice
+        self._sandboxes += 1
+        try:
+            yield self
+        finally:
+            self._sandboxes -= 1
+            self.events = events
+            self.dice = dice
+            self.rollback(mark)
+
+    @property
+    def in_sandbox(self) -> bool:
+        """Whether the board is holding trial moves that will be rolled back"""
+        return self._sandboxes > 0
+
     def conquer(
             self, player: 'Player',
             territory_from: 'Territory', territory_to: 'Territory', armies: int)\
             -> None:
         """Short hand for changing territory owner and moving armies"""
         assert armies < territory_from.armies
-        logging.info("{} taken over by {}".format(territory_to.name, player.name))
+        if self.events.subscribers:
+            self.events.emit(Conquest(player, territory_from, territory_to, armies))
         self.set_owner(territory_to, player)
         self.move_armies(territory_from, territory_to, armies)
 
     def add_armies(self, territory: 'Territory', armies: int) -> None:
         """Add x armies to territory"""
-        logging.info("Add {} armies to {}".format(armies, territory.name))
-        territory.set_armies(territory.armies + armies)
+        if self.events.subscribers:
+            self.events.emit(Deploy(territory, armies))
+        self.set_armies(territory, territory.armies + armies)
 
     def move_armies(
             self, territory_from: 'Territory', territory_to: 'Territory', armies: int) -> None:
         """Move x armies between territories"""
-        logging.info("{} armies moved from {} to {}".format(
-            armies, territory_from.name, territory_to.name))
-        territory_to.set_armies(territory_to.armies + armies)
-        territory_from.set_armies(territory_from.armies - armies)
+        if self.events.subscribers:
+            self.events.emit(Move(territory_from, territory_to, armies))
+        self.set_armies(territory_to, territory_to.armies + armies)
+        self.set_armies(territory_from, territory_from.armies - armies)
 
     def remove_armies(self, territory: 'Territory', armies: int) -> None:
         """Remove x armies from territory"""
-        territory.set_armies(max(territory.armies - armies, 0))
+        self.set_armies(territory, max(territory.armies - armies, 0))
 
     def count_territories(self, player: 'Player') -> int:
         """Get the territories owned by player"""
-        return int(self.player_territory_count[player])
+        if player not in self.player_ids:
+            return 0
+        return len(self._owned[self.player_ids[player]])
 
     def count_continents(self, player: 'Player') -> int:
         """Calculate bonus for all contients"""
-        bonus = 0
-        for continent_name in self.continent_values.keys():
-            bonus += self.calculate_contienent(player, continent_name)
-        return bonus
+        if player not in self.player_ids:
+            return 0
+        return int(self.continent_bonus[self.continent_holders == self.player_ids[player]].sum())
 
     def calculate_contienent(self, player: 'Player', name: str) -> int:
         """Calculate if you get a bonus for contienent x"""
-        members = [territory for territory in self.territories if territory.continent == name]
-        if all(m.owner and m.owner.name == player.name for m in members):
-            return int(self.continent_values[name])
+        continent = self.continent_index[name]
+        if player in self.player_ids and self.continent_holders.item(continent) == self.player_ids[player]:
+            return int(self.continent_bonus.item(continent))
         else:
             return 0
 
 
 class Territory:
     """A Location on a map, most importantly a territory has
-    connections to other territories, an owner and armies"""
+    connections to other territories, an owner and armies.
+    A territory made by a World reads and writes its owner and armies through it"""
     def __init__(
             self, id: int, name: str, continent: str, coordinates: Tuple[float, float],
-            connections: List[int]):
+            connections: List[int], world: 'Optional[World]' = None, index: int = 0):
         self.id = id
         self.name = name
         self.coordinates = coordinates
         self.continent = continent
         self.connections = connections
-        self.owner = None  # type: Optional[Player]
-        self.armies = 0  # type: int
+        self.world = world
+        self.index = index
+        self._owner = None  # type: Optional[Player]
+        self._armies = 0  # type: int
 
     def __eq__(self, other) -> Any:
         return self.id == other.id
@@ -156,22 +443,54 @@ class Territory:
     def __hash__(self):
         return hash(repr(self))
 
+    def view(self, world: 'World') -> 'Territory':
+        """The same territory on another world"""
+        return Territory(
+            self.id, self.name, self.continent, self.coordinates, self.connections,
+            world=world, index=self.index)
+
+    @property
+    def owner(self) -> 'Optional[Player]':
+        if self.world is None:
+            return self._owner
+        return self.world.get_owner(self.index)
+
+    @owner.setter
+    def owner(self, player: 'Player') -> None:
+        self.set_owner(player)
+
+    @property
+    def armies(self) -> int:
+        if self.world is None:
+            return self._armies
+        return int(self.world.army_counts.item(self.index))
+
+    @armies.setter
+    def armies(self, armies: int) -> None:
+        self.set_armies(armies)
+
     def get_coordinates(self) -> str:
         """Generate a coordinate string for graphviz"""
         return "{},{}!".format(*self.coordinates)
 
     def set_owner(self, player: 'Player') -> None:
         """Set the owner to player"""
-        self.owner = player
+        if self.world is None:
+            self._owner = player
+        else:
+            self.world.set_owner(self, player)
 
     def set_armies(self, armies: int) -> None:
         assert armies >= 0
-        self.armies = armies
+        if self.world is None:
+            self._armies = armies
+        else:
+            self.world.set_armies(self, armies)
 
 
-def make_map() -> World:
-    """Create the classic world map"""
-    map = World()
+def make_map(dice: 'Optional[Dice]' = None) -> World:
+    """Create the classic world map, rolling with dice if given"""
+    map = World(dice)
     map.set_continent_army_value('North America', 5)
     map.make_territory(1, 'Alaska', 'North America', (0, 0), [2, 4, 30])
     map.make_territory(2, 'North West Territory', 'North America', (2, 0), [1, 3, 4, 5])
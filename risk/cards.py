@@ -1,4 +1,3 @@
-import random
 from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
@@ -10,6 +9,7 @@ class CardDeck:
     SUITS = ["Infantry", "Calvary", "Cannon"]
 
     def __init__(self, map: 'World') -> None:
+        self.dice = map.deal_dice
         self.cards = set()
         for i, t in enumerate(map.territories):
             self.cards.add(Card(t, CardDeck.SUITS[i % len(CardDeck.SUITS)]))
@@ -17,7 +17,7 @@ class CardDeck:
             self.cards.add(Card(None, "Wildcard"))
 
     def draw(self) -> 'Card':
-        c = random.choice(sorted(list(self.cards)))
+        c = self.dice.choice(sorted(list(self.cards)))  # type: Card
         self.cards.remove(c)
         return c
 
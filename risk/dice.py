@@ -1,5 +1,104 @@
+import random
+from typing import Any, Optional, Sequence, Tuple, Union
+
 import numpy as np
 
+DICE_BUFFER = 1 << 16  # dice drawn from the generator at a time
+
 
 def roll_dice(number: int) -> np.ndarray:
     return np.random.randint(1, 7, size=number)
+
+
+def roll_dice_block(rounds: int, number: int) -> np.ndarray:
+    """Roll number dice for many rounds at once, one row per round"""
+    return np.random.randint(1, 7, size=(rounds, number))
+
+
+class Dice:
+    """Source of all the randomness in a game"""
+    def roll(self, number: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def roll_block(self, rounds: int, number: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def random(self, size: int) -> np.ndarray:
+        """Uniform floats in [0, 1)"""
+        raise NotImplementedError
+
+    def randint(self, low: int, high: int) -> int:
+        """Integer in [low, high] inclusive, like random.randint"""
+        raise NotImplementedError
+
+    def choice(self, sequence: Sequence[Any]) -> Any:
+        raise NotImplementedError
+
+
+class GlobalDice(Dice):
+    """Dice from the global random states seeded by random.seed and np.random.seed"""
+    def roll(self, number: int) -> np.ndarray:
+        return roll_dice(number)
+
+    def roll_block(self, rounds: int, number: int) -> np.ndarray:
+        return roll_dice_block(rounds, number)
+
+    def random(self, size: int) -> np.ndarray:
+        return np.random.random_sample(size)
+
+    def randint(self, low: int, high: int) -> int:
+        return random.randint(low, high)
+
+    def choice(self, sequence: Sequence[Any]) -> Any:
+        return random.choice(sequence)
+
+
+class DiceStream(Dice):
+    """Dice for one game from its own seeded generator, drawn in bulk into a buffer
+    and handed out from there so a game can be replayed from its seed"""
+    def __init__(
+            self, seed: 'Optional[Union[int, np.random.SeedSequence]]' = None,
+            buffer_size: int = DICE_BUFFER) -> None:
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self.buffer_size = buffer_size
+        self._buffer = np.zeros(0, dtype=np.int8)
+        self._position = 0
+
+    def _refill(self, number: int) -> None:
+        remaining = self._buffer[self._position:]
+        fresh = self.generator.integers(1, 7, size=max(self.buffer_size, number), dtype=np.int8)
+        self._buffer = np.concatenate((remaining, fresh))
+        self._position = 0
+
+    def roll(self, number: int) -> np.ndarray:
+        if self._position + number > len(self._buffer):
+            self._refill(number)
+        rolls = self._buffer[self._position:self._position + number]
+        self._position += number
+        return rolls
+
+    def roll_block(self, rounds: int, number: int) -> np.ndarray:
+        return self.roll(rounds * number).reshape(rounds, number)
+
+    def random(self, size: int) -> np.ndarray:
+        return self.generator.random(size)
+
+    def randint(self, low: int, high: int) -> int:
+        return int(self.generator.integers(low, high + 1))
+
+    def choice(self, sequence: Sequence[Any]) -> Any:
+        return sequence[int(self.generator.integers(len(sequence)))]
+
+
+GLOBAL_DICE = GlobalDice()  # used by games that are not given their own seed
+
+
+def game_dice(seed: Optional[int]) -> Tuple[Dice, Dice, Dice]:
+    """Dice for dealing territories and cards, for the agents' choices and for
+    combat, each drawn from its own stream of the game's seed so one of them using
+    more numbers does not shift the others"""
+    if seed is None:
+        return GLOBAL_DICE, GLOBAL_DICE, GLOBAL_DICE
+    deal, agents, combat = np.random.SeedSequence(seed).spawn(3)
+    return DiceStream(deal), DiceStream(agents), DiceStream(combat)
@@ -0,0 +1,151 @@
+import logging
+from typing import Any, Callable, List, NamedTuple, Tuple, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from risk.board import Territory
+    from risk.cards import Card
+    from risk.player import Player
+
+# Game Events
+#
+# The board and the rules announce what happens in a game as typed events on the
+# World's event stream. Events are only built when something has subscribed, every
+# emitter checks `if map.events.subscribers:` first, so a headless game with no
+# subscribers does no formatting or allocation for them. Logs and plot labels are
+# both built from the events by subscribers.
+
+
+class TurnStart(NamedTuple):
+    player: 'Player'
+    turn: int
+
+    def describe(self) -> str:
+        return "{}'s turn".format(self.player.name)
+
+
+class Reinforcements(NamedTuple):
+    player: 'Player'
+    armies: int
+    continent_bonus: int
+    card_bonus: int
+
+    def describe(self) -> str:
+        return "{} gets {} (+{}+{} bonus) armies this turn".format(
+            self.player.name, self.armies, self.continent_bonus, self.card_bonus)
+
+
+class CardTrade(NamedTuple):
+    player: 'Player'
+    cards: 'Tuple[Card, ...]'
+    bonus: int
+
+    def describe(self) -> str:
+        return "{} trades {} cards for {} armies".format(self.player.name, len(self.cards), self.bonus)
+
+
+class Deploy(NamedTuple):
+    territory: 'Territory'
+    armies: int
+
+    def describe(self) -> str:
+        return "Add {} armies to {}".format(self.armies, self.territory.name)
+
+
+class Move(NamedTuple):
+    territory_from: 'Territory'
+    territory_to: 'Territory'
+    armies: int
+
+    def describe(self) -> str:
+        return "{} armies moved from {} to {}".format(
+            self.armies, self.territory_from.name, self.territory_to.name)
+
+
+class Attack(NamedTuple):
+    player: 'Player'
+    territory_from: 'Territory'
+    territory_to: 'Territory'
+    armies: int
+
+    def describe(self) -> str:
+        return "{} attacks {} from {} with {} armies".format(
+            self.player.name, self.territory_to.name, self.territory_from.name, self.armies)
+
+
+class BattleResult(NamedTuple):
+    territory: 'Territory'
+    attacker_losses: int
+    defender_losses: int
+    attacker_wins: bool
+
+    def describe(self) -> str:
+        prefix = "Attacker wins" if self.attacker_wins else "Defender holds"
+        return "{} {}, losses Attacker: {} Defender {}".format(
+            prefix, self.territory.name, self.attacker_losses, self.defender_losses)
+
+
+class Conquest(NamedTuple):
+    player: 'Player'
+    territory_from: 'Territory'
+    territory_to: 'Territory'
+    armies: int
+
+    def describe(self) -> str:
+        return "{} taken over by {}".format(self.territory_to.name, self.player.name)
+
+
+class Elimination(NamedTuple):
+    player: 'Player'
+
+    def describe(self) -> str:
+        return "{} is eliminated".format(self.player.name)
+
+
+class GameOver(NamedTuple):
+    winner: str
+    turns: int
+
+    def describe(self) -> str:
+        return "Winner is {}".format(self.winner)
+
+
+Subscriber = Callable[[Any], None]
+
+
+class EventStream:
+    """Subscribers and the kinds of event each one wants"""
+    def __init__(self) -> None:
+        self.subscribers = []  # type: List[Tuple[Subscriber, Tuple[Type[Any], ...]]]
+
+    def subscribe(self, subscriber: Subscriber, *kinds: Type[Any]) -> Subscriber:
+        """Call subscriber with every event of these kinds, or of every kind if none are given"""
+        self.subscribers.append((subscriber, kinds))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers = [(s, kinds) for s, kinds in self.subscribers if s != subscriber]
+
+    def emit(self, event: Any) -> None:
+        for subscriber, kinds in self.subscribers:
+            if not kinds or isinstance(event, kinds):
+                subscriber(event)
+
+
+def log_event(event: Any) -> None:
+    """Subscriber that logs every event"""
+    logging.info(event.describe())
+
+
+class EventLog:
+    """Subscriber that keeps the descriptions of events until cleared"""
+    def __init__(self) -> None:
+        self.lines = []  # type: List[str]
+
+    def __call__(self, event: Any) -> None:
+        self.lines.append(event.describe())
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def clear(self) -> None:
+        self.lines = []
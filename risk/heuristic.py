@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from risk.board import World, Territory
     from risk.player import Player
+    from risk.transposition import TranspositionTable
 
 BORDER_SECURITY_FACTOR = 1
 FOREIGN_TERRITORY_FACTOR = 1
@@ -31,3 +32,13 @@ def heuristic(map: 'World', player: 'Player') -> float:
                      for t in map.territories if t.owner) -
                  OWN_CONTINENT_FACTOR * map.count_continents(player) + FOREIGN_CONTINENT_FACTOR *
                  sum(map.count_continents(p) for p in map.players if p.name != player.name))
+
+
+def cached_heuristic(map: 'World', player: 'Player', table: 'TranspositionTable') -> float:
+    """Heuristic of the board, reusing the value from table for a position seen before"""
+    key = (map.zobrist(), player.name)
+    value = table.get(key)
+    if value is None:
+        value = heuristic(map, player)
+        table.store(key, value)
+    return float(value)
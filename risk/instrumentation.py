@@ -0,0 +1,149 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, TYPE_CHECKING
+
+import risk.rules as rules
+from risk.battle_estimator import get_cached_probabilities
+
+if TYPE_CHECKING:
+    from risk.board import World
+    from risk.player import Player
+
+# Instrumentation
+#
+# The game loop checks rules.instrumentation and only records anything when it is
+# set, so games played without it pay for a comparison against None and nothing
+# else. Timings are kept as histograms with power of two buckets of microseconds,
+# so a tournament of any length takes the same memory. Games played in other
+# processes send back their exports, which merge_exports adds up.
+
+AGENT_CALLS = ('deploy', 'attacks', 'attack_commit', 'check_cards')
+
+
+class Histogram:
+    """Count, total, extremes and power of two buckets of a series of timings"""
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = defaultdict(int)  # type: Dict[int, int]
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[max(0, math.ceil(math.log2(max(seconds * 1e6, 1))))] += 1
+
+    def export(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'histogram': {"<={}us".format(2 ** b): self.buckets[b] for b in sorted(self.buckets)}}
+
+
+class Instrumentation:
+    """Timings of each game phase and agent call, and counts of game events"""
+    def __init__(self) -> None:
+        self.timings = defaultdict(Histogram)  # type: Dict[Tuple[str, str], Histogram]
+        self.counters = defaultdict(int)  # type: Dict[str, int]
+        self._estimator_start = (get_cached_probabilities.hits, get_cached_probabilities.grows)
+
+    def time(self, name: str, player: 'Player', seconds: float) -> None:
+        self.timings[(name, player.name)].add(seconds)
+
+    def count(self, name: str, increment: int = 1) -> None:
+        self.counters[name] += increment
+
+    def wrap_player(self, player: 'Player') -> None:
+        """Time the player's decisions by shadowing its methods on the instance,
+        leaving out the calls made for its own trial moves in a sandbox"""
+        for name in AGENT_CALLS:
+            setattr(player, name, self._timed(player, name, getattr(player, name)))
+
+    def _timed(self, player: 'Player', name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+        histogram = self.timings[(name, player.name)]
+
+        @functools.wraps(method)
+        def timed(map: 'World', *args: Any, **kwargs: Any) -> Any:
+            if map.in_sandbox:
+                return method(map, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(map, *args, **kwargs)
+            finally:
+                histogram.add(time.perf_counter() - start)
+        return timed
+
+    def export(self) -> Dict[str, Any]:
+        """Counters and timing histograms keyed by name then player"""
+        hits, grows = self._estimator_start
+        counters = dict(self.counters)
+        counters['estimator_hits'] = get_cached_probabilities.hits - hits
+        counters['estimator_grows'] = get_cached_probabilities.grows - grows
+        timings = defaultdict(dict)  # type: Dict[str, Dict[str, Any]]
+        for (name, player), histogram in sorted(self.timings.items()):
+            timings[name][player] = histogram.export()
+        return {'counters': counters, 'timings': dict(timings)}
+
+    def summary(self) -> str:
+        """Table of mean and worst timings and the counters"""
+        return summarise_export(self.export())
+
+
+def merge_histograms(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """One exported histogram of the timings in two"""
+    count = first['count'] + second['count']
+    total = first['total'] + second['total']
+    buckets = defaultdict(int, first['histogram'])  # type: Dict[str, int]
+    for bucket, hits in second['histogram'].items():
+        buckets[bucket] += hits
+    return {
+        'count': count,
+        'total': total,
+        'mean': total / count if count else 0.0,
+        'max': max(first['max'], second['max']),
+        'histogram': {b: buckets[b] for b in sorted(buckets, key=lambda b: int(b[2:-2]))}}
+
+
+def merge_exports(exports: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """One export of the games recorded in many, such as those played by each worker of a tournament"""
+    counters = defaultdict(int)  # type: Dict[str, int]
+    timings = defaultdict(dict)  # type: Dict[str, Dict[str, Any]]
+    for export in exports:
+        for name, value in export['counters'].items():
+            counters[name] += value
+        for name, players in export['timings'].items():
+            for player, histogram in players.items():
+                merged = timings[name]
+                merged[player] = merge_histograms(merged[player], histogram) if player in merged else histogram
+    return {
+        'counters': dict(counters),
+        'timings': {name: dict(sorted(players.items())) for name, players in sorted(timings.items())}}
+
+
+def summarise_export(export: Dict[str, Any]) -> str:
+    """Table of mean and worst timings and the counters of an export"""
+    lines = []  # type: List[str]
+    for name, players in sorted(export['timings'].items()):
+        for player, histogram in sorted(players.items()):
+            lines.append("{:14} {:14} {:8d} calls, mean {:10.1f}us, max {:10.1f}us".format(
+                name, player, histogram['count'], histogram['mean'] * 1e6, histogram['max'] * 1e6))
+    for name, value in sorted(export['counters'].items()):
+        lines.append("{:29} {:8d}".format(name, value))
+    return "\n".join(lines)
+
+
+@contextmanager
+def instrumented() -> Iterator[Instrumentation]:
+    """Record every game played inside the block"""
+    instruments = Instrumentation()
+    previous, rules.instrumentation = rules.instrumentation, instruments
+    try:
+        yield instruments
+    finally:
+        rules.instrumentation = previous
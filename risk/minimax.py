@@ -1,67 +1,385 @@
+from collections import defaultdict
+import math
 import time
 import logging
 
 logging.getLogger().setLevel(logging.INFO)
 
-# TODO handle multiple plays
-# TODO MaxN and Paranoid algorithms variants
-# TODO Natural Play (Dice)
-# TODO Killer heuristic
-# TODO negamax scout
+# Alpha-beta search with iterative deepening
+#
+# Each iteration searches one ply deeper than the last with the best root move of
+# the previous iteration tried first, until max_depth or the time budget. Inside
+# the tree moves that caused a cutoff at the same ply (killers) and moves with a
+# history of cutoffs are tried first, and every move after the first is searched
+# with a null window (principal variation search) and only searched again with
+# the full window when it might be better. A search stopped by the clock returns
+# the best move of the last finished iteration.
+#
+# A game state may make its moves in place and take them back with undo, and say
+# with is_maximising whose move it is when one player moves several times in a row.
+#
+# Expectiminimax searches games with dice. A move the game state gives chance
+# outcomes for is a chance node scored by the expected score of its outcomes, with
+# the unlikeliest outcomes holding mass_threshold of the probability left out.
+# Scores must lie within the state's score_bounds, which lets a chance node stop
+# once the outcomes still to search cannot move its score back inside the window
+# (Star1). With probe set every outcome is first probed by searching only its
+# first move, which bounds each outcome more tightly and can cut the node off
+# without a full search of any of them (Star2). Probing pays off when the bounds
+# of the game are loose and good first moves are cheap to find, on Risk boards
+# Star1 alone already cuts most chance nodes so it is off by default.
+#
+# Games of more than two players need a game state that gives the current_player
+# to move. Paranoid search assumes every other player is out to minimise the root
+# player's score, which makes it a two player game that alpha-beta can prune.
+# Max^n scores positions with a vector of scores, one for each player from the
+# state's evaluate_all, and each player picks the move best for themselves. Max^n
+# can only prune shallowly, when the game state gives a score_sum that the
+# non-negative scores of every position add up to: once a player is sure of
+# enough of the sum their parent cannot get more than it already has elsewhere.
+
+CHECK_TIME_EVERY = 256  # nodes between looks at the clock
+NULL_WINDOW = 1e-9  # width of a null window relative to the size of the scores
+KILLERS = 2  # killer moves kept per ply
+MASS_THRESHOLD = 0.01  # probability of the unlikeliest chance outcomes left out of a search
+
+
+class SearchTimeout(Exception):
+    """The time budget ran out during a search"""
 
 
 class Minimax():
-    def __init__(self, max_depth, max_time):
+    def __init__(self, max_depth, max_time, table=None):
         self.max_depth = max_depth
         self.max_time = max_time
+        self.table = table  # optional TranspositionTable shared between searches
+        self.killers = defaultdict(list)
+        self.history = defaultdict(int)
+        self.stats = {}
+        self.start_time = time.time()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.depth_limited = False
 
     def elapsed_time(self):
         """keep Track of run time"""
         return time.time() - self.start_time
 
     def find_best(self, game_state):
-        """Method to intitate a search from game_state"""
+        """Best move from game_state and its score, searching deeper until the
+        time runs out or the whole tree has been searched"""
         self.start_time = time.time()
-        alpha, beta = float("-inf"), float("inf")
-        depth = 1
-        best = max(
-            map(lambda move: self.search(move, self.min_play, game_state, alpha, beta, depth),
-                game_state.get_available_moves()), key=lambda x: x[1])
+        self._reset_counters()
+        self.killers.clear()
+        self.history.clear()
+        moves = list(game_state.get_available_moves())
+        child = game_state.next_state(moves[0])
+        best = (moves[0], self.evaluate(child))
+        self.undo(child)
+        completed = 0
+        for depth in range(1, self.max_depth + 1):
+            self.depth_limited = False
+            try:
+                best = self.search_root(game_state, moves, depth)
+            except SearchTimeout:
+                break
+            completed = depth
+            moves.remove(best[0])
+            moves.insert(0, best[0])
+            if not self.depth_limited or self.elapsed_time() > self.max_time:
+                break
+        self.stats = self.search_stats(completed)
         logging.info("Found Best {}, Time taken {}".format(best, self.elapsed_time()))
         return best
 
-    def is_search_termination(self, game_state, depth):
-        """Evalulate if to end the search"""
-        return (game_state.is_gameover() or
-                depth > self.max_depth or
-                self.elapsed_time() > self.max_time)
-
-    def search(self, move, function, game_state, alpha, beta, depth):
-        """Function to search onward from a move, function can be either max or min"""
-        moves, score = function(
-            game_state.next_state(move), alpha, beta, depth + 1)
-        if function.__name__ == 'max_play':
+    def search_stats(self, depth):
+        """Counters of the last search"""
+        elapsed = max(self.elapsed_time(), 1e-9)
+        return {
+            'depth': depth,
+            'nodes': self.nodes,
+            'nodes_per_second': self.nodes / elapsed,
+            'cutoff_rate': self.cutoffs / self.interior_nodes if self.interior_nodes else 0.0,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+        }
+
+    def evaluate(self, game_state):
+        return self.lookup(game_state, game_state.evaluate)
+
+    def lookup(self, game_state, evaluate, kind=None):
+        """Evaluate a position, looking it up in the transposition table
+        when the game state can give its Zobrist hash"""
+        if self.table is None or not hasattr(game_state, 'zobrist'):
+            return evaluate()
+        key = game_state.zobrist() if kind is None else (kind, game_state.zobrist())
+        score = self.table.get(key)
+        if score is None:
+            score = evaluate()
+            self.table.store(key, score)
+        return score
+
+    def search_root(self, game_state, moves, depth):
+        """Best move and score at the root, the maximising player's turn"""
+        alpha, beta = float("-inf"), float("inf")
+        best_move, best_score = moves[0], float("-inf")
+        for i, move in enumerate(moves):
+            score = self.search_move(game_state, move, i, depth - 1, alpha, beta, True, 1)
+            if score > best_score:
+                best_move, best_score = move, score
             alpha = max(alpha, score)
-        else:
-            beta = min(beta, score)
-        return move, alpha, beta, score
-
-    def min_play(self, game_state, alpha, beta, depth):
-        logging.info("Min play at depth {}".format(depth))
-        if self.is_search_termination(game_state, depth):
-            return None, game_state.evaluate()
-        branch_min = min(
-            map(lambda move: self.search(move, self.max_play, game_state, alpha, beta, depth),
-                game_state.get_available_moves()), key=lambda x: x[-1])
-        return branch_min
-
-    def max_play(self, game_state, alpha, beta, depth):
-        logging.info("Max play at depth {}".format(depth))
-        if (game_state.is_gameover() or
-                depth > self.max_depth or
-                self.elapsed_time() > self.max_time):
-            return None, game_state.evaluate()
-        branch_max = max(
-            map(lambda move: self.search(move, self.min_play, game_state, alpha, beta, depth),
-                game_state.get_available_moves()), key=lambda x: x[-1])
-        return branch_max
+        return best_move, best_score
+
+    def search_move(self, game_state, move, i, depth, alpha, beta, maximising, ply):
+        """Score of move, the i'th move tried from game_state"""
+        return self.principal_variation(game_state.next_state(move), i, depth, alpha, beta, maximising, ply)
+
+    def principal_variation(self, child, i, depth, alpha, beta, parent_maximising, ply):
+        """Score of the i'th child of a node, moves after the first are tried with a
+        null window first and searched fully only when they could change the result"""
+        maximising = self.is_maximising(child, parent_maximising)
+        bound = alpha if parent_maximising else beta  # the score the child has to beat
+        try:
+            if i == 0 or math.isinf(bound):
+                return self.alpha_beta(child, depth, alpha, beta, maximising, ply)
+            width = NULL_WINDOW * max(1.0, abs(bound))
+            if parent_maximising:
+                score = self.alpha_beta(child, depth, alpha, alpha + width, maximising, ply)
+            else:
+                score = self.alpha_beta(child, depth, beta - width, beta, maximising, ply)
+            if alpha < score < beta:
+                score = self.alpha_beta(child, depth, alpha, beta, maximising, ply)
+            return score
+        finally:
+            self.undo(child)
+
+    def is_maximising(self, child, parent_maximising):
+        """Whether the player to move in child is the maximising player, game states
+        where a player can make several moves in a row say so themselves"""
+        if hasattr(child, 'is_maximising'):
+            return child.is_maximising()
+        return not parent_maximising
+
+    def undo(self, child):
+        """Take back the move that made child, for game states that make
+        their moves in place rather than returning a new state"""
+        if hasattr(child, 'undo'):
+            child.undo()
+
+    def alpha_beta(self, game_state, depth, alpha, beta, maximising, ply):
+        """Minimax score of game_state within the window alpha to beta"""
+        self.nodes += 1
+        if self.nodes % CHECK_TIME_EVERY == 0 and self.elapsed_time() > self.max_time:
+            raise SearchTimeout()
+        if game_state.is_gameover():
+            return self.evaluate(game_state)
+        if depth <= 0:
+            self.depth_limited = True
+            return self.evaluate(game_state)
+        moves = self.order_moves(game_state.get_available_moves(), ply)
+        if not moves:
+            return self.evaluate(game_state)
+        self.interior_nodes += 1
+        best = float("-inf") if maximising else float("inf")
+        for i, move in enumerate(moves):
+            score = self.search_move(game_state, move, i, depth - 1, alpha, beta, maximising, ply + 1)
+            if maximising:
+                best = max(best, score)
+                alpha = max(alpha, score)
+            else:
+                best = min(best, score)
+                beta = min(beta, score)
+            if alpha >= beta:
+                self.cutoff(move, i, depth, ply)
+                break
+        return best
+
+    def order_moves(self, moves, ply):
+        """Killer moves for this ply first, then moves by their history of cutoffs"""
+        killers = self.killers[ply]
+        return sorted(
+            moves, key=lambda move: (killers.index(move) if move in killers else KILLERS, -self.history[move]))
+
+    def cutoff(self, move, i, depth, ply):
+        """Remember a move that refuted its position"""
+        self.cutoffs += 1
+        if i == 0:
+            self.first_move_cutoffs += 1
+        killers = self.killers[ply]
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[KILLERS:]
+        self.history[move] += depth * depth
+
+
+def prune_outcomes(outcomes, threshold):
+    """The likeliest (probability, outcome) pairs holding all but threshold of the
+    probability, rescaled to add up to one"""
+    kept, mass = [], 0.0
+    for probability, outcome in sorted(outcomes, key=lambda o: -o[0]):
+        kept.append((probability, outcome))
+        mass += probability
+        if mass >= 1 - threshold:
+            break
+    return [(probability / mass, outcome) for probability, outcome in kept]
+
+
+class Expectiminimax(Minimax):
+    """Minimax over games with chance, moves with random outcomes are scored by
+    the expected score of their outcomes"""
+    def __init__(self, max_depth, max_time, table=None, mass_threshold=MASS_THRESHOLD, probe=False):
+        self.mass_threshold = mass_threshold
+        self.probe = probe  # Star2 probing of chance nodes before searching them
+        super().__init__(max_depth, max_time, table)
+
+    def _reset_counters(self):
+        super()._reset_counters()
+        self.chance_nodes = 0
+        self.chance_cutoffs = 0
+
+    def search_stats(self, depth):
+        stats = super().search_stats(depth)
+        stats['chance_nodes'] = self.chance_nodes
+        stats['chance_cutoff_rate'] = self.chance_cutoffs / self.chance_nodes if self.chance_nodes else 0.0
+        return stats
+
+    def search_move(self, game_state, move, i, depth, alpha, beta, maximising, ply):
+        outcomes = game_state.chance_outcomes(move) if hasattr(game_state, 'chance_outcomes') else None
+        if not outcomes:
+            return super().search_move(game_state, move, i, depth, alpha, beta, maximising, ply)
+        self.chance_nodes += 1
+        outcomes = prune_outcomes(outcomes, self.mass_threshold)
+        low, high = game_state.score_bounds()
+        lower, upper = [low] * len(outcomes), [high] * len(outcomes)
+        if self.probe and depth > 0:
+            score = self.probe_outcomes(game_state, move, outcomes, lower, upper, depth, alpha, beta, maximising, ply)
+            if score is not None:
+                self.chance_cutoffs += 1
+                return score
+        return self.chance_node(game_state, move, outcomes, lower, upper, depth, alpha, beta, maximising, ply)
+
+    def probe_outcomes(self, game_state, move, outcomes, lower, upper, depth, alpha, beta, parent_maximising, ply):
+        """Star2, tighten the bounds on each outcome by searching only its first
+        move, returns a score if the bounds alone put the node outside the window"""
+        for i, (probability, outcome) in enumerate(outcomes):
+            child = game_state.next_state(move, outcome)
+            try:
+                maximising = self.is_maximising(child, parent_maximising)
+                moves = [] if child.is_gameover() else self.order_moves(child.get_available_moves(), ply)
+                if not moves:
+                    continue
+                score = self.search_move(child, moves[0], 0, depth - 1, lower[i], upper[i], maximising, ply + 1)
+            finally:
+                self.undo(child)
+            # the first move is a lower bound on a max node and an upper bound on a min node
+            if maximising:
+                lower[i] = max(lower[i], score)
+                expected = sum(p * bound for (p, _), bound in zip(outcomes, lower))
+                if expected >= beta:
+                    return expected
+            else:
+                upper[i] = min(upper[i], score)
+                expected = sum(p * bound for (p, _), bound in zip(outcomes, upper))
+                if expected <= alpha:
+                    return expected
+        return None
+
+    def chance_node(self, game_state, move, outcomes, lower, upper, depth, alpha, beta, parent_maximising, ply):
+        """Star1, expected score of the outcomes, stopping once the outcomes
+        left cannot bring it back inside the window alpha to beta"""
+        searched = 0.0
+        rest_lower = sum(p * bound for (p, _), bound in zip(outcomes, lower))
+        rest_upper = sum(p * bound for (p, _), bound in zip(outcomes, upper))
+        for i, (probability, outcome) in enumerate(outcomes):
+            rest_lower -= probability * lower[i]
+            rest_upper -= probability * upper[i]
+            if searched + probability * lower[i] + rest_lower >= beta:
+                self.chance_cutoffs += 1
+                return searched + probability * lower[i] + rest_lower
+            if searched + probability * upper[i] + rest_upper <= alpha:
+                self.chance_cutoffs += 1
+                return searched + probability * upper[i] + rest_upper
+            # scores of this outcome that decide the node on their own
+            fail_low = (alpha - searched - rest_upper) / probability
+            fail_high = (beta - searched - rest_lower) / probability
+            score = self.principal_variation(
+                game_state.next_state(move, outcome), 0, depth,
+                max(fail_low, lower[i]), min(fail_high, upper[i]), parent_maximising, ply)
+            searched += probability * score
+            if score <= fail_low or score >= fail_high:
+                if i < len(outcomes) - 1:
+                    self.chance_cutoffs += 1
+                return searched + (rest_upper if score <= fail_low else rest_lower)
+        return searched
+
+
+class Paranoid(Minimax):
+    """Minimax for more than two players, the player to move at the root against
+    a coalition of all the others, game states evaluate for the root player"""
+    def find_best(self, game_state):
+        self.root_player = game_state.current_player()
+        return super().find_best(game_state)
+
+    def is_maximising(self, child, parent_maximising):
+        return child.current_player() == self.root_player
+
+
+class MaxN(Minimax):
+    """Search for more than two players where every player maximises their own
+    score, find_best gives the best move and the vector of scores it leads to"""
+    def find_best(self, game_state):
+        self.score_sum = game_state.score_sum() if hasattr(game_state, 'score_sum') else None
+        return super().find_best(game_state)
+
+    def evaluate(self, game_state):
+        return self.lookup(game_state, lambda: tuple(game_state.evaluate_all()), 'scores')
+
+    def search_root(self, game_state, moves, depth):
+        player = game_state.current_player()
+        best_move, best = moves[0], None
+        for move in moves:
+            scores = self.search_child(
+                game_state.next_state(move), depth - 1, player, float("-inf") if best is None else best[player], 1)
+            if best is None or scores[player] > best[player]:
+                best_move, best = move, scores
+        return best_move, best
+
+    def search_child(self, child, depth, parent_player, bound, ply):
+        try:
+            return self.max_n(child, depth, parent_player, bound, ply)
+        finally:
+            self.undo(child)
+
+    def max_n(self, game_state, depth, parent_player, bound, ply):
+        """Scores of game_state for every player, bound is the best score the
+        player that moved to it is already sure of"""
+        self.nodes += 1
+        if self.nodes % CHECK_TIME_EVERY == 0 and self.elapsed_time() > self.max_time:
+            raise SearchTimeout()
+        if game_state.is_gameover():
+            return self.evaluate(game_state)
+        if depth <= 0:
+            self.depth_limited = True
+            return self.evaluate(game_state)
+        moves = self.order_moves(game_state.get_available_moves(), ply)
+        if not moves:
+            return self.evaluate(game_state)
+        self.interior_nodes += 1
+        player = game_state.current_player()
+        best = None
+        for i, move in enumerate(moves):
+            scores = self.search_child(
+                game_state.next_state(move), depth - 1, player, float("-inf") if best is None else best[player],
+                ply + 1)
+            if best is None or scores[player] > best[player]:
+                best = scores
+            # shallow pruning, the parent's score here can be at most what player leaves of the sum
+            if self.score_sum is not None and player != parent_player and self.score_sum - best[player] <= bound:
+                self.cutoff(move, i, depth, ply)
+                break
+        return best
@@ -0,0 +1,129 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import threading
+from typing import Callable, Iterable, List, NamedTuple, Tuple, Union, TYPE_CHECKING
+
+from graphviz import Graph
+
+if TYPE_CHECKING:
+    from typing import Iterator, Optional
+    from risk.board import World
+
+# Rendering
+#
+# Drawing a board runs the neato binary, so games hand a small snapshot of the
+# board to a pool of background threads instead of waiting on it. The threads
+# spend their time waiting on neato so they do not hold up the game. At most
+# max_pending snapshots wait to be drawn, a game producing them faster than they
+# can be drawn is held up until there is room. Snapshots can also be kept and
+# drawn together once a game is over.
+
+OUTPUT_DIRECTORY = 'outputs'
+
+
+class Layout(NamedTuple):
+    """The parts of the board that do not change during a game"""
+    names: Tuple[str, ...]
+    positions: Tuple[str, ...]
+    edges: Tuple[Tuple[int, int], ...]
+
+
+class Snapshot(NamedTuple):
+    """Who owns each territory and how many armies are on it at one moment"""
+    name: str
+    description: str
+    owners: Tuple[int, ...]
+    armies: Tuple[int, ...]
+
+
+def layout(map: 'World') -> Layout:
+    return Layout(
+        tuple(t.name for t in map.territories),
+        tuple(t.get_coordinates() for t in map.territories),
+        tuple((t.index, i - 1) for t in map.territories for i in t.connections))
+
+
+def snapshot(map: 'World', name: str, description: str) -> Snapshot:
+    return Snapshot(
+        name, description,
+        tuple(map.player_list[i].index if i >= 0 else -1 for i in map.owner_ids.tolist()),
+        tuple(map.army_counts.tolist()))
+
+
+def render_snapshot(layout: Layout, snapshot: Snapshot, directory: str = OUTPUT_DIRECTORY) -> None:
+    """Draw the board as an SVG named after the snapshot"""
+    g = Graph('World', filename='world.gv', engine='neato')
+    g.attr(label=snapshot.description)
+    g.attr('node', colorscheme="pastel19", style="filled")
+    for name, position, owner, armies in zip(layout.names, layout.positions, snapshot.owners, snapshot.armies):
+        assert owner >= 0
+        g.node(name, "{} ({:4d})".format(name, armies), fillcolor=str(owner + 1), pos=position)
+    for i, j in layout.edges:
+        g.edge(layout.names[i], layout.names[j])
+    g.format = 'svg'
+    path = os.path.join(directory, snapshot.name)
+    g.render(path, view=False)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+Renderer = Callable[[Layout, Snapshot], None]
+
+
+class RenderPool:
+    """Draws snapshots on background threads, submit blocks while max_pending are waiting"""
+    def __init__(
+            self, layout: Layout, workers: int = 2, max_pending: int = 16,
+            render: 'Optional[Renderer]' = None) -> None:
+        self.layout = layout
+        self.render = render or render_snapshot
+        self.executor = ThreadPoolExecutor(workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []  # type: List[BaseException]
+
+    def submit(self, snapshot: Snapshot) -> None:
+        self.slots.acquire()
+        self.executor.submit(self.render, self.layout, snapshot).add_done_callback(self._done)
+
+    def _done(self, future: 'Future[None]') -> None:
+        self.slots.release()
+        error = future.exception()
+        if error is not None:
+            self.errors.append(error)
+
+    def close(self) -> None:
+        """Wait for every snapshot to be drawn, raising the first error if any failed"""
+        self.executor.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self) -> 'RenderPool':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def render_game(
+        layout: Layout, snapshots: Iterable[Snapshot], workers: int = 4,
+        render: 'Optional[Renderer]' = None) -> None:
+    """Draw all the snapshots of a finished game"""
+    with RenderPool(layout, workers, render=render) as pool:
+        for s in snapshots:
+            pool.submit(s)
+
+
+@contextmanager
+def plotter(map: 'World', mode: Union[bool, str]) -> 'Iterator[Optional[Callable[[Snapshot], None]]]':
+    """Where a game sends its snapshots, drawn in the background if mode is True,
+    all at the end of the game if it is 'batch' and not at all if it is False"""
+    if not mode:
+        yield None
+    elif mode == 'batch':
+        snapshots = []  # type: List[Snapshot]
+        yield snapshots.append
+        render_game(layout(map), snapshots)
+    else:
+        with RenderPool(layout(map)) as pool:
+            yield pool.submit
@@ -0,0 +1,195 @@
+import struct
+from typing import Any, BinaryIO, Callable, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import risk.board as board
+from risk.events import TurnStart, Deploy, Move, Attack, BattleResult, Conquest, Elimination, GameOver
+from risk.player import Player
+
+if TYPE_CHECKING:
+    from risk.board import World
+
+# Replays
+#
+# A replay file is a header, the names of the players in seat order, one fixed
+# size record for each event of the game and keyframes of every owner and army
+# count. Records are kept in a list while the game is played and written in one
+# go at the end. A keyframe is taken at the start of every keyframe_interval'th
+# turn, the first one holds the territory allocation, so the board at any turn is
+# rebuilt from the keyframe before it and at most keyframe_interval turns of records.
+#
+# Owners are stored as seat indexes with -1 for nobody.
+
+MAGIC = b'RSKR'
+VERSION = 1
+HEADER = struct.Struct('<4sHqHHII')  # magic, version, seed, territories, players, records, keyframes
+NO_SEED = -1
+
+TURN, DEPLOY, MOVE, ATTACK, BATTLE, CONQUEST, ELIMINATION, GAME_OVER = range(8)
+
+RECORD = np.dtype([
+    ('kind', 'u1'), ('player', 'i1'), ('source', '<u2'), ('target', '<u2'), ('armies', '<i4'), ('extra', '<i4')])
+
+
+class Keyframe(NamedTuple):
+    turn: int
+    record: int  # index of the turn's first record
+    owners: np.ndarray
+    armies: np.ndarray
+
+
+class ReplayRecorder:
+    """Subscriber to a game's events that saves them as a replay"""
+    def __init__(self, map: 'World', seed: Optional[int] = None, keyframe_interval: int = 10) -> None:
+        self.map = map
+        self.seed = seed
+        self.keyframe_interval = keyframe_interval
+        self.records = []  # type: List[Tuple[int, int, int, int, int, int]]
+        self.keyframes = []  # type: List[Keyframe]
+        self.seats = []  # type: List[Player]
+        self.turn = 0
+        self.source = 0  # territory the last attack came from
+
+    def __call__(self, event: Any) -> None:
+        kind = type(event)
+        if kind is TurnStart:
+            if not self.seats:
+                self.seats = sorted(self.map.player_list, key=lambda p: p.index)
+            if event.turn != self.turn:
+                self.turn = event.turn
+                if (event.turn - 1) % self.keyframe_interval == 0:
+                    self.keyframes.append(self._keyframe())
+            self.records.append((TURN, event.player.index, 0, 0, event.turn, 0))
+        elif kind is Deploy:
+            self.records.append((DEPLOY, -1, 0, event.territory.index, event.armies, 0))
+        elif kind is Move:
+            self.records.append((MOVE, -1, event.territory_from.index, event.territory_to.index, event.armies, 0))
+        elif kind is Attack:
+            self.source = event.territory_from.index
+            self.records.append((
+                ATTACK, event.player.index, self.source, event.territory_to.index, event.armies, 0))
+        elif kind is BattleResult:
+            self.records.append((
+                BATTLE, -1, self.source, event.territory.index, event.attacker_losses, event.defender_losses))
+        elif kind is Conquest:
+            self.records.append((
+                CONQUEST, event.player.index, event.territory_from.index, event.territory_to.index,
+                event.armies, 0))
+        elif kind is Elimination:
+            self.records.append((ELIMINATION, event.player.index, 0, 0, 0, 0))
+        elif kind is GameOver:
+            winner = [p.index for p in self.seats if p.name == event.winner]
+            self.records.append((GAME_OVER, winner[0] if winner else -1, 0, 0, event.turns, 0))
+
+    def _keyframe(self) -> Keyframe:
+        seat_of = np.array([p.index for p in self.map.player_list] + [-1], dtype=np.int16)
+        return Keyframe(self.turn, len(self.records), seat_of[self.map.owner_ids], self.map.army_counts.copy())
+
+    def save(self, path: str) -> None:
+        records = np.array(self.records, dtype=RECORD)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, NO_SEED if self.seed is None else self.seed, len(self.map.territories),
+                len(self.seats), len(records), len(self.keyframes)))
+            for player in self.seats:
+                name = player.name.encode('utf8')
+                f.write(struct.pack('<B', len(name)) + name)
+            f.write(records.tobytes())
+            for keyframe in self.keyframes:
+                f.write(struct.pack('<II', keyframe.turn, keyframe.record))
+                f.write(keyframe.owners.astype('<i2').tobytes())
+                f.write(keyframe.armies.astype('<i4').tobytes())
+
+
+def _read(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Replay is cut short")
+    return data
+
+
+class Replay:
+    """A saved game that can rebuild the board at the start of any turn"""
+    def __init__(
+            self, seed: Optional[int], names: List[str], records: np.ndarray, keyframes: List[Keyframe],
+            territories: int) -> None:
+        self.seed = seed
+        self.territories = territories  # on the map the game was played on
+        self.names = names
+        self.records = records
+        self.keyframes = keyframes
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as f:
+            magic, version, seed, territories, players, records, keyframes = HEADER.unpack(_read(f, HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{} is not a version {} replay".format(path, VERSION))
+            names = []
+            for _ in range(players):
+                length, = struct.unpack('<B', _read(f, 1))
+                names.append(_read(f, length).decode('utf8'))
+            events = np.frombuffer(_read(f, records * RECORD.itemsize), dtype=RECORD)
+            frames = []
+            for _ in range(keyframes):
+                turn, record = struct.unpack('<II', _read(f, 8))
+                owners = np.frombuffer(_read(f, territories * 2), dtype='<i2')
+                armies = np.frombuffer(_read(f, territories * 4), dtype='<i4')
+                frames.append(Keyframe(turn, record, owners, armies))
+        return cls(None if seed == NO_SEED else seed, names, events, frames, territories)
+
+    @property
+    def turns(self) -> int:
+        """Turns played, the last turn if the game was not finished"""
+        over = self.records[self.records['kind'] == GAME_OVER]
+        if len(over):
+            return int(over['armies'][0])
+        return int(self.records['armies'][self.records['kind'] == TURN].max())
+
+    def winner(self) -> Optional[str]:
+        over = self.records[self.records['kind'] == GAME_OVER]
+        return self.names[over['player'][0]] if len(over) and over['player'][0] >= 0 else None
+
+    def world_at(
+            self, turn: Optional[int] = None, make_map: 'Callable[[], World]' = board.make_map)\
+            -> 'Tuple[World, List[Player]]':
+        """Board and players at the start of turn, or at the end of the game if turn is None,
+        on a new board from make_map which has to be the map the game was played on"""
+        earlier = [frame for frame in self.keyframes if turn is None or frame.turn <= turn]
+        keyframe = earlier[-1] if earlier else self.keyframes[0]
+        map = make_map()
+        if len(map.territories) != self.territories:
+            raise ValueError("Replay is of a map with {} territories, not {}".format(
+                self.territories, len(map.territories)))
+        players = [Player(i, name) for i, name in enumerate(self.names)]
+        for player in players:
+            map.player_id(player)
+        for territory, owner, armies in zip(map.territories, keyframe.owners.tolist(), keyframe.armies.tolist()):
+            if owner >= 0:
+                map.set_owner(territory, players[owner])
+            map.set_armies(territory, armies)
+        for record in self.records[keyframe.record:].tolist():
+            kind, player, source, target, armies, extra = record
+            if kind == TURN and turn is not None and armies >= turn:
+                break
+            apply_record(map, players, kind, player, source, target, armies, extra)
+        for player in players:
+            player.in_game = bool(map.count_territories(player))
+        return map, players
+
+
+def apply_record(
+        map: 'World', players: List[Player],
+        kind: int, player: int, source: int, target: int, armies: int, extra: int) -> None:
+    """Make the change to the board a record describes"""
+    territories = map.territories
+    if kind == DEPLOY:
+        map.add_armies(territories[target], armies)
+    elif kind == MOVE:
+        map.move_armies(territories[source], territories[target], armies)
+    elif kind == BATTLE:
+        map.remove_armies(territories[source], armies)
+        map.remove_armies(territories[target], extra)
+    elif kind == CONQUEST:
+        map.set_owner(territories[target], players[player])
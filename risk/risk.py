@@ -1,23 +1,31 @@
 from collections import defaultdict
+from contextlib import nullcontext
 import logging
+import os
 import time
-from typing import Dict, Any, TYPE_CHECKING
+from typing import Dict, Any, Tuple, TYPE_CHECKING
 
 import risk.board as board
 import risk.agents as agents
 import risk.rules as rules
 import risk.cards as cards
+from risk.dice import game_dice
+from risk.instrumentation import instrumented
+from risk.replay import ReplayRecorder
 from risk.battle_estimator import get_cached_probabilities
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import List, Optional
+    from risk.board import World
     from risk.cards import CardDeck
+    from risk.player import Player
 
 logging.getLogger().setLevel(logging.INFO)
 logging.disable(logging.CRITICAL)
 
 options = {
     'players': 3,
+    'agents': None,  # agent in each seat, e.g. ['Greedy', 'Standard'], None for all Standard
     'stocasticity': True,  # False does not roll dice
     'markov': False,  # If True replaces simulated dice roll with the probable outcomes
     'initial_placement': 'random',  # random|pick
@@ -27,39 +35,77 @@ options = {
     'death_or_glory': True,  # Cannot withdraw after commiting
     'end_of_turn_slide': False,
     'bonus_cards': 'fixed',  # none|fixed|yes
-    'plot_gameplay': True,  # if True generate graphviz plots in ./output for each turn
+    'plot_gameplay': True,  # True|batch|False graphviz plots of each turn drawn in the background or after the game
+    'instrument': False,  # if True print timings of each phase and agent call after a tournament
+    'replays': None,  # directory to save a replay of every game in
     'logging_level': logging.CRITICAL
 }  # type: Dict[str, Any]
 
 
-def risk(name: str, options: Dict[str, Any]):
-    map = board.make_map()
+def setup_game(options: Dict[str, Any], seed: 'Optional[int]' = None, template: 'Optional[World]' = None)\
+        -> 'Tuple[World, Optional[CardDeck], List[Player]]':
+    """Board, cards and players for a new game, an unplayed template board
+    is copied instead of building a new map"""
+    map = board.make_map() if template is None else template.make_copy()
+    if seed is not None:
+        map.deal_dice, map.agent_dice, map.dice = game_dice(seed)
     players = agents.make_players(options)
     if options['bonus_cards'] == 'yes':
         deck = cards.CardDeck(map)  # type: Optional[CardDeck]
     else:
         deck = None
-    return rules.play_game(name, map, deck, players, options)
+    return map, deck, players
 
 
-def tournament(games: int, options):
+def risk(name: str, options: Dict[str, Any], seed: 'Optional[int]' = None, template: 'Optional[World]' = None)\
+        -> Tuple[str, int]:
+    """Play one game, the same seed always plays out the same game"""
+    map, deck, players = setup_game(options, seed, template)
+    return play_recorded(name, map, deck, players, options, seed)
+
+
+def play_recorded(
+        name: str, map: 'World', deck: 'Optional[CardDeck]', players: 'List[Player]',
+        options: Dict[str, Any], seed: 'Optional[int]' = None)\
+        -> Tuple[str, int]:
+    """Play a game that has been set up, saving its replay as name in the replays directory if there is one"""
+    if not options.get('replays'):
+        return rules.play_game(name, map, deck, players, options)
+    recorder = ReplayRecorder(map, seed)
+    map.events.subscribe(recorder)
+    result = rules.play_game(name, map, deck, players, options)
+    os.makedirs(options['replays'], exist_ok=True)
+    recorder.save(os.path.join(options['replays'], "{}.replay".format(name)))
+    return result
+
+
+def record_result(tournament_score: Dict[str, Dict[str, Any]], winner: str, turns: int) -> None:
+    """Add a game to the winner's count and running average of turns"""
+    tournament_score[winner]['wins'] += 1
+    tournament_score[winner]['avg_turns'] = (
+        (tournament_score[winner]['wins'] - 1) *
+        tournament_score[winner]['avg_turns'] + turns) /\
+        tournament_score[winner]['wins']
+
+
+def tournament(games: int, options, seed: int = 0):
+    """Play games one after another, game i seeded with seed + i"""
     logging.getLogger().setLevel(options['logging_level'])
     tournament_score = defaultdict(
         lambda: {'wins': 0, 'avg_turns': 0})  # type: Dict[str, Dict[str, int]]
     if options['markov']:
-        get_cached_probabilities(50, 50)  # Build a large state cache to avoid many matrix cals
+        get_cached_probabilities.prewarm(50)  # Build a large state cache to avoid growing mid game
     start = time.time()
-    for i in range(games):
-        name = "game {}".format(i)
-        logging.debug(name)
-        winner, turns = risk(name, options)
-        tournament_score[winner]['wins'] += 1
-        tournament_score[winner]['avg_turns'] = (
-            (tournament_score[winner]['wins'] - 1) *
-            tournament_score[winner]['avg_turns'] + turns) /\
-            tournament_score[winner]['wins']
+    with instrumented() if options.get('instrument') else nullcontext() as instruments:
+        for i in range(games):
+            name = "game {}".format(i)
+            logging.debug(name)
+            winner, turns = risk(name, options, seed + i)
+            record_result(tournament_score, winner, turns)
     end = time.time()
     print(end - start)
+    if instruments is not None:
+        print(instruments.summary())
     return tournament_score
 
 
@@ -1,17 +1,24 @@
 import math
 import logging
-import io
+import time
 from collections import defaultdict
 from typing import List, Dict, Any, Tuple, TYPE_CHECKING
 
-import risk.dice as dice
+import numpy as np
+
+from risk.dice import Dice, GLOBAL_DICE
+from risk.events import (
+    EventLog, log_event, TurnStart, Reinforcements, CardTrade, Attack, BattleResult, Elimination, GameOver)
 from risk.battle_estimator import generate_outcome
+import risk.render as render
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Callable, Optional
     from risk.board import World, Territory
     from risk.cards import Card, CardDeck
+    from risk.instrumentation import Instrumentation
     from risk.player import Player
+    from risk.render import Snapshot
 
 # Create the logger
 logger = logging.getLogger()
@@ -22,6 +29,14 @@ MIN_DEPLOYMENT = 3
 MAX_ATTACK = 3
 MAX_DEFENSE = 2
 CALL_STALEMATE = 1000
+ROUND_BLOCK = 4  # rounds first rolled for a battle the attacker may withdraw from
+
+instrumentation = None  # type: Optional[Instrumentation]
+
+
+def recording(map: 'World') -> 'Optional[Instrumentation]':
+    """Instrumentation to record a game event on, none for an agent's trial moves in a sandbox"""
+    return None if map.in_sandbox else instrumentation
 
 
 def summary(map: 'World') -> None:
@@ -38,28 +53,43 @@ def play_game(
         players: 'List[Player]', options: Dict[str, Any])\
         -> Tuple[str, int]:
     """Plays a whole game until there is a winner or it stalemates"""
+    if instrumentation is not None:
+        instrumentation.count('games')
+        for player in players:
+            instrumentation.wrap_player(player)
+    logs = logger.isEnabledFor(logging.INFO)
+    if logs:
+        map.events.subscribe(log_event)
     map.allocate_territories(players)
     turn = 1
     first = options['extra_start_deployment']
-    while len([p for p in players if p.in_game]) > 1 and turn < CALL_STALEMATE:
-        logging.info("TURN {}".format(turn))
-        play_round(map, cards, players, first, name, turn, options)
-        logging.info("End of TURN {}".format(turn))
-        summary(map)
-        turn += 1
-        first = False
+    with render.plotter(map, options['plot_gameplay']) as plot:
+        while len([p for p in players if p.in_game]) > 1 and turn < CALL_STALEMATE:
+            play_round(map, cards, players, first, name, turn, options, plot)
+            if logs:
+                summary(map)
+            turn += 1
+            first = False
+    if instrumentation is not None:
+        instrumentation.count('turns', turn - 1)
     if turn < CALL_STALEMATE:  # stop game going on forever
         winner = [p.name for p in players if p.in_game][0]
-        logging.info("Winner is {}".format(winner))
     else:
         winner = 'Draw'
+    if map.events.subscribers:
+        map.events.emit(GameOver(winner, turn))
+    if logs:
+        map.events.unsubscribe(log_event)
     return winner, turn
 
 
 def check_players(map: 'World', players: 'List[Player]') -> None:
     """Check which players still have territory"""
     for check_player in players:
-        check_player.in_game = bool(map.count_territories(check_player))
+        in_game = bool(map.count_territories(check_player))
+        if check_player.in_game and not in_game and map.events.subscribers:
+            map.events.emit(Elimination(check_player))
+        check_player.in_game = in_game
 
 
 def active_players(players: 'List[Player]') -> int:
@@ -69,23 +99,29 @@ def active_players(players: 'List[Player]') -> int:
 
 def play_round(
         map: 'World', cards: 'Optional[CardDeck]', players: 'List[Player]', first: bool, name: str, turn: int,
-        options: Dict[str, Any]) -> None:
+        options: Dict[str, Any], plot: 'Optional[Callable[[Snapshot], None]]' = None) -> None:
+    """Every player still in the game takes a turn, plot is sent a snapshot after each turn"""
+    turn_log = EventLog() if plot is not None else None
+    if turn_log is not None:
+        map.events.subscribe(turn_log)
     for player in players:
         if player.in_game:
-            log_capture_string = io.StringIO()  # Capture the log to printing turn outcomes
-            ch = logging.StreamHandler(log_capture_string)
-            logger.addHandler(ch)
-            logging.info("{}'s turn".format(player.name))
-            play_turn(map, cards, player, first, options)
-            log_contents = log_capture_string.getvalue()
-            logger.handlers.pop()
-            log_capture_string.close()
-            if options['plot_gameplay']:
-                map.make_graph(
-                    "map-{}-{}-{}".format(name, turn, player.index), log_contents.lower())
+            if map.events.subscribers:
+                map.events.emit(TurnStart(player, turn))
+            if instrumentation is not None:
+                start = time.perf_counter()
+                play_turn(map, cards, player, first, options)
+                instrumentation.time('turn', player, time.perf_counter() - start)
+            else:
+                play_turn(map, cards, player, first, options)
+            if plot is not None and turn_log is not None:
+                plot(render.snapshot(map, "map-{}-{}-{}".format(name, turn, player.index), turn_log.text().lower()))
+                turn_log.clear()
             check_players(map, players)
         if active_players(players) == 1:
             break
+    if turn_log is not None:
+        map.events.unsubscribe(turn_log)
 
 
 def play_turn(
@@ -93,35 +129,52 @@ def play_turn(
         first_turn: bool, options: Dict[str, Any])\
         -> None:
     """Play a players turn with 3 phases"""
+    if instrumentation is not None:
+        start = time.perf_counter()
     # 1. Deployment
     base_armies = calculate_troop_deployment(map, player)
     contienent_bonus = calculate_contienent_bonus(map, player)
-    if options['bonus_cards'] == 'yes':
-        assert cards is not None
-        actual_cards: CardDeck = cards
-        returns, card_bonus = player.check_cards(map, base_armies)
-        if returns:
-            actual_cards.returns(returns)
-    elif options['bonus_cards'] == 'fixed':
-        card_bonus = 2 if player.success else 0
-    elif options['bonus_cards'] == 'none':
-        card_bonus = 0
-    else:
-        raise ValueError("Invalid setting")
+    card_bonus = calculate_card_bonus(map, cards, player, base_armies, options)
     armies = base_armies + contienent_bonus + card_bonus
-    logging.info("{} gets {} (+{}+{} bonus) armies this turn"
-                 .format(player.name, base_armies, contienent_bonus, card_bonus))
+    if map.events.subscribers:
+        map.events.emit(Reinforcements(player, base_armies, contienent_bonus, card_bonus))
     deploy(map, player, armies)
+    if instrumentation is not None:
+        deployed = time.perf_counter()
+        instrumentation.time('deployment', player, deployed - start)
     # 2. Combats
     if not first_turn:
         player.success = attacks(map, player, options)
         if player.success and options['bonus_cards'] == 'yes':
-            player.take_card(draw_card(actual_cards))
+            assert cards is not None
+            player.take_card(draw_card(cards))
+        if instrumentation is not None:
+            instrumentation.time('combat', player, time.perf_counter() - deployed)
         # 3. End of Turn Slide
         if options['end_of_turn_slide']:
             slide(map, player)
 
 
+def calculate_card_bonus(
+        map: 'World', cards: 'Optional[CardDeck]', player: 'Player', base_armies: int,
+        options: Dict[str, Any]) -> int:
+    """Armies the player gets for cards this turn, handing them in if they want to"""
+    if options['bonus_cards'] == 'yes':
+        assert cards is not None
+        returns, card_bonus = player.check_cards(map, base_armies)
+        if returns:
+            cards.returns(returns)
+            if map.events.subscribers:
+                map.events.emit(CardTrade(player, tuple(returns), card_bonus))
+        return int(card_bonus)
+    elif options['bonus_cards'] == 'fixed':
+        return 2 if player.success else 0
+    elif options['bonus_cards'] == 'none':
+        return 0
+    else:
+        raise ValueError("Invalid setting")
+
+
 def deploy(map: 'World', player: 'Player', armies: int):
     """Ask the player where they want to deploy"""
     player.deploy(map, armies)
@@ -141,8 +194,6 @@ def attacks(map: 'World', player: 'Player', options: Dict[str, Any]) -> bool:
     """Play out the list of combats player specifies"""
     at_least_one_victory = False
     attack_plan = player.attacks(map, options)[:options['attack_limit']]
-    if len(attack_plan) == 0:
-        logging.info("No attacks made by {}".format(player))
     for territory_from, territory_to in attack_plan:
         if (territory_from.owner == player and
            territory_to.owner != player and
@@ -155,12 +206,6 @@ def attacks(map: 'World', player: 'Player', options: Dict[str, Any]) -> bool:
     return at_least_one_victory
 
 
-def battle_results(ac: int, dc: int, attacker_wins: bool, name: str) -> None:
-    """Log results of combat"""
-    prefix = "Attacker wins" if attacker_wins else "Defender holds"
-    logging.info("{} {}, losses Attacker: {} Defender {}".format(prefix, name, dc, ac))
-
-
 def attack(
         map: 'World', player: 'Player', options: Dict[str, Any],
         territory_from: 'Territory', territory_to: 'Territory')\
@@ -169,22 +214,31 @@ def attack(
     ac, dc = 0, 0
     commited_attackers = player.attack_commit(map, territory_from, territory_to)
     assert commited_attackers < territory_from.armies
+    instruments = recording(map)
+    if instruments is not None:
+        instruments.count('battles')
+    if map.events.subscribers:
+        map.events.emit(Attack(player, territory_from, territory_to, commited_attackers))
     if options['markov']:
-        a, d = generate_outcome(commited_attackers, territory_to.armies)[0]
-        ac, dc = commited_attackers - a, territory_to.armies - d
-        map.remove_armies(territory_from, ac)
-        map.remove_armies(territory_to, dc)
+        a, d = generate_outcome(commited_attackers, territory_to.armies, dice=map.dice)[0]
+        ac, dc = territory_to.armies - d, commited_attackers - a
+        map.remove_armies(territory_from, dc)
+        map.remove_armies(territory_to, ac)
+    elif options['stocasticity']:
+        ac, dc = dice_battle(map, player, options, territory_from, territory_to, commited_attackers)
     else:
         while ((True if options['death_or_glory']
                 else player.attack_continue(map, territory_from, territory_to)) and
                 territory_from.armies > 1 and
                 territory_to.armies > 0):
-            a, d = combat(commited_attackers, territory_to.armies, options)
+            a, d = combat(commited_attackers, territory_to.armies, options, map.dice)
+            d = min(d, territory_from.armies - 1)  # the army left behind never fights
             ac += a
             dc += d
             map.remove_armies(territory_from, d)
             map.remove_armies(territory_to, a)
-    battle_results(ac, dc, territory_to.armies == 0, territory_to.name)
+    if map.events.subscribers:
+        map.events.emit(BattleResult(territory_to, dc, ac, territory_to.armies == 0))
     if territory_to.armies == 0:
         invaders = min(commited_attackers, territory_from.armies - 1)
         map.conquer(player, territory_from, territory_to,
@@ -194,13 +248,98 @@ def attack(
         return False
 
 
-def combat(attackers: int, defenders: int, options: Dict[str, Any]) -> Tuple[int, int]:
+def dice_battle(
+        map: 'World', player: 'Player', options: Dict[str, Any],
+        territory_from: 'Territory', territory_to: 'Territory', commited_attackers: int)\
+        -> Tuple[int, int]:
+    """Play out combat with the dice rolled a block of rounds at a time,
+    returns the armies killed by the attacker and by the defender"""
+    attack_dice = min(commited_attackers, MAX_ATTACK)
+    attackers, defenders = territory_from.armies, territory_to.armies
+    instruments = recording(map)
+    if options['death_or_glory']:
+        defender_losses, attacker_losses = battle_losses(attack_dice, attackers, defenders, map.dice)
+        if instruments is not None:
+            instruments.count('rounds_rolled', attackers + defenders)
+        map.remove_armies(territory_from, attacker_losses)
+        map.remove_armies(territory_to, defender_losses)
+        return defender_losses, attacker_losses
+    # the attacker may withdraw after any round, so rounds are rolled in blocks that
+    # double in size, never more than the armies left could fight as every round
+    # kills at least one, and the dice of a block cut short are thrown away
+    pairs = min(attack_dice, MAX_DEFENSE)
+    double, single = np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+    ac, dc, i, block = 0, 0, 0, ROUND_BLOCK // 2
+    while (player.attack_continue(map, territory_from, territory_to) and
+           territory_from.armies > 1 and
+           territory_to.armies > 0):
+        if i == len(double):
+            block = min(2 * block, territory_from.armies - 1 + territory_to.armies)
+            double, single = roll_rounds(attack_dice, block, map.dice)
+            if instruments is not None:
+                instruments.count('rounds_rolled', block)
+            i = 0
+        if territory_to.armies >= MAX_DEFENSE:
+            a, d = int(double[i]), pairs - int(double[i])
+        else:
+            a, d = int(single[i]), 1 - int(single[i])
+        d = min(d, territory_from.armies - 1)  # the army left behind never fights
+        ac += a
+        dc += d
+        i += 1
+        map.remove_armies(territory_from, d)
+        map.remove_armies(territory_to, a)
+    return ac, dc
+
+
+def roll_rounds(attack_dice: int, rounds: int, dice: Dice = GLOBAL_DICE) -> Tuple[np.ndarray, np.ndarray]:
+    """Roll many rounds of combat at once, returns the armies the attacker kills
+    in each round if the defender rolls two dice and if they roll one"""
+    attack = -np.sort(-dice.roll_block(rounds, attack_dice), axis=1)
+    defend = dice.roll_block(rounds, MAX_DEFENSE)
+    single = attack[:, 0] > defend[:, 0]
+    defend = -np.sort(-defend, axis=1)
+    pairs = min(attack_dice, MAX_DEFENSE)
+    double = (attack[:, :pairs] > defend[:, :pairs]).sum(axis=1)
+    return double, single
+
+
+def battle_losses(
+        attack_dice: int, attackers: int, defenders: int, dice: Dice = GLOBAL_DICE) -> Tuple[int, int]:
+    """Fight until the attacker is down to one army or the defender is wiped out,
+    returns the armies lost by the defender and by the attacker, who never loses
+    the army left behind"""
+    rounds = attackers + defenders
+    double, single = roll_rounds(attack_dice, rounds, dice)
+    pairs = min(attack_dice, MAX_DEFENSE)
+    a, d, played = attackers, defenders, 0
+    if d >= MAX_DEFENSE:
+        # both sides keep their dice until the defender is down to one army
+        a_left = a - np.cumsum(pairs - double)
+        d_left = d - np.cumsum(double)
+        played = int(np.argmax((a_left <= 1) | (d_left < MAX_DEFENSE))) + 1
+        a, d = max(int(a_left[played - 1]), 1), int(d_left[played - 1])
+    if a > 1 and d == 1:
+        # the attacker loses one army a round until they win one
+        wins = np.flatnonzero(single[played:])
+        losses = int(wins[0]) if len(wins) else rounds
+        if losses >= a - 1:
+            a = 1
+        else:
+            a, d = a - losses, 0
+    return defenders - d, attackers - a
+
+
+def combat(
+        attackers: int, defenders: int, options: Dict[str, Any], dice: Dice = GLOBAL_DICE) -> Tuple[int, int]:
     """How combat works based on options"""
     assert attackers > 0
     assert defenders > 0
     if options['stocasticity']:
-        attack = dice.roll_dice(min(attackers, MAX_ATTACK))
-        defend = dice.roll_dice(min(defenders, MAX_DEFENSE))
+        if instrumentation is not None:
+            instrumentation.count('rounds_rolled')
+        attack = dice.roll(min(attackers, MAX_ATTACK))
+        defend = dice.roll(min(defenders, MAX_DEFENSE))
         attacker_kills, defender_kills = 0, 0
         for a, d in zip(sorted(attack, reverse=True), sorted(defend, reverse=True)):
             if a > d:
@@ -0,0 +1,203 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from risk.battle_estimator import get_cached_probabilities
+from risk.heuristic import heuristic
+from risk.rules import calculate_troop_deployment, calculate_contienent_bonus
+
+if TYPE_CHECKING:
+    from risk.board import World
+    from risk.player import Player
+
+# Search states
+#
+# RiskState lets Minimax search a real board. Each move is made on the one World
+# the state is given and taken back with the board's journal once it has been
+# searched, so a search never copies the board. Search inside map.sandbox() to
+# keep the trial moves out of the game's events.
+#
+# Moves are small integers read straight off the ownership and adjacency arrays:
+# END_TURN, 1 + t to deploy the turn's armies on territory t, and after those one
+# move per directed edge of the adjacency and commit level for attacks. Attacks
+# are chance moves, their outcomes are the battle estimator's distribution of the
+# armies left, and a battle given no outcome takes its most likely one.
+#
+# evaluate scores the board for the root player alone, for Minimax, Paranoid and
+# Expectiminimax, and evaluate_all gives every player's share for MaxN.
+
+END_TURN = 0
+DEPLOY, ATTACK = 1, 2
+COMMIT_LEVELS = (1.0, 0.5)  # share of the spare armies committed to an attack
+MAX_ATTACKS = 3  # attacks searched in one turn
+LOSS = -1e6  # score of a lost game, below any heuristic score and finite so null windows around it work
+
+
+@lru_cache(maxsize=None)
+def likely_outcome(a: int, d: int) -> Tuple[int, int]:
+    """Attackers and defenders left after the most likely outcome of a battle"""
+    states, probs = get_cached_probabilities(a, d)
+    left = states[int(np.argmax(probs))]
+    return int(left[0]), int(left[1])
+
+
+@lru_cache(maxsize=None)
+def battle_outcomes(a: int, d: int) -> Tuple[Tuple[float, Tuple[int, int]], ...]:
+    """Probability and attackers and defenders left of each outcome of a battle, likeliest first"""
+    states, probs = get_cached_probabilities(a, d)
+    outcomes = [(float(p), (int(left[0]), int(left[1]))) for p, left in zip(probs, states) if p > 0]
+    return tuple(sorted(outcomes, key=lambda o: -o[0]))
+
+
+def commit(armies: int, level: int) -> int:
+    """Armies committed from a territory holding armies at a commit level"""
+    return max(1, int((armies - 1) * COMMIT_LEVELS[level]))
+
+
+def commit_levels(armies: int) -> List[int]:
+    """Commit levels that each commit a different number of armies"""
+    counts = [commit(armies, level) for level in range(len(COMMIT_LEVELS))]
+    return [level for level, count in enumerate(counts) if count not in counts[:level]]
+
+
+class RiskState:
+    """A turn of a game seen from player, the territories, armies and whose move it is"""
+    def __init__(
+            self, map: 'World', players: 'List[Player]', player: 'Player',
+            reinforcements: Optional[int] = None, max_attacks: int = MAX_ATTACKS) -> None:
+        self.map = map
+        self.players = players  # in turn order
+        self.root = player  # whose position is evaluated
+        self.player = player  # to move
+        self.reinforcements = self.turn_reinforcements(player) if reinforcements is None else reinforcements
+        self.max_attacks = max_attacks
+        self.attacks_made = 0
+        indptr, indices = map.adjacency()
+        self._indptr = indptr.tolist()
+        self._sources = np.repeat(np.arange(len(map.territories)), np.diff(indptr)).tolist()
+        self._targets = indices.tolist()
+        self._first_attack = 1 + len(map.territories)
+        self._undo = []  # type: List[Tuple[int, Player, int, int]]
+
+    def turn_reinforcements(self, player: 'Player') -> int:
+        return calculate_troop_deployment(self.map, player) + calculate_contienent_bonus(self.map, player)
+
+    def encode_deploy(self, territory: int) -> int:
+        return 1 + territory
+
+    def encode_attack(self, source: int, target: int, level: int = 0) -> int:
+        edge = self._indptr[source] + self.map.neighbour_ids(source).index(target)
+        return int(self._first_attack + edge * len(COMMIT_LEVELS) + level)
+
+    def decode(self, move: int) -> Tuple[int, int, int, int]:
+        """Kind, source, target and commit level of a move"""
+        if move == END_TURN:
+            return END_TURN, -1, -1, 0
+        if move < self._first_attack:
+            return DEPLOY, -1, move - 1, 0
+        edge, level = divmod(move - self._first_attack, len(COMMIT_LEVELS))
+        return ATTACK, self._sources[edge], self._targets[edge], level
+
+    def get_available_moves(self) -> List[int]:
+        if self.is_gameover():
+            return []
+        if self.reinforcements:
+            return [self.encode_deploy(t.index) for t in
+                    self.map.border_territories(self.player) or self.map.owned_territories(self.player)]
+        moves = []  # type: List[int]
+        if self.attacks_made < self.max_attacks:
+            owner = self.map.player_ids[self.player]
+            owners = self.map.owner_ids.tolist()
+            armies = self.map.army_counts.tolist()
+            for t in self.map.border_territories(self.player):
+                if armies[t.index] < 2:
+                    continue
+                levels = commit_levels(armies[t.index])
+                for edge in range(self._indptr[t.index], self._indptr[t.index + 1]):
+                    if owners[self._targets[edge]] not in (owner, -1):
+                        base = self._first_attack + edge * len(COMMIT_LEVELS)
+                        moves.extend(base + level for level in levels)
+        moves.append(END_TURN)
+        return moves
+
+    def chance_outcomes(self, move: int) -> Tuple[Tuple[float, Tuple[int, int]], ...]:
+        """Outcomes of an attack with their probabilities, none for other moves"""
+        kind, source, target, level = self.decode(move)
+        if kind != ATTACK:
+            return ()
+        return battle_outcomes(commit(int(self.map.army_counts[source]), level), int(self.map.army_counts[target]))
+
+    def next_state(self, move: int, outcome: Optional[Tuple[int, int]] = None) -> 'RiskState':
+        """Make move on the board, this state becomes the next one until undo. An
+        attack leaves the attackers and defenders of outcome, or the likeliest outcome"""
+        self._undo.append((self.map.checkpoint(), self.player, self.reinforcements, self.attacks_made))
+        kind, source, target, level = self.decode(move)
+        if kind == DEPLOY:
+            self.map.add_armies(self.map.territories[target], self.reinforcements)
+            self.reinforcements = 0
+        elif kind == ATTACK:
+            self._attack(source, target, level, outcome)
+        else:
+            self._end_turn()
+        return self
+
+    def undo(self) -> None:
+        """Take back the last move"""
+        mark, self.player, self.reinforcements, self.attacks_made = self._undo.pop()
+        self.map.rollback(mark)
+
+    def _attack(self, source: int, target: int, level: int, outcome: Optional[Tuple[int, int]]) -> None:
+        territory_from, territory_to = self.map.territories[source], self.map.territories[target]
+        committed = commit(territory_from.armies, level)
+        defenders = territory_to.armies
+        a, d = outcome or likely_outcome(committed, defenders)
+        self.map.remove_armies(territory_from, committed - a)
+        self.map.remove_armies(territory_to, defenders - d)
+        if d == 0:
+            self.map.conquer(self.player, territory_from, territory_to, a)
+        self.attacks_made += 1
+
+    def _end_turn(self) -> None:
+        i = self.players.index(self.player)
+        for player in self.players[i + 1:] + self.players[:i + 1]:
+            if self.map.count_territories(player):
+                break
+        self.player = player
+        self.reinforcements = self.turn_reinforcements(player)
+        self.attacks_made = 0
+
+    def is_maximising(self) -> bool:
+        return self.player is self.root
+
+    def is_gameover(self) -> bool:
+        return sum(1 for p in self.players if self.map.count_territories(p)) <= 1
+
+    def evaluate(self) -> float:
+        """Score of the board for the root player, higher is better, a won game scores 0
+        as the heuristic of a board with no foreign territories or borders"""
+        if not self.map.count_territories(self.root):
+            return LOSS
+        return -heuristic(self.map, self.root)
+
+    def evaluate_all(self) -> List[float]:
+        """Share of the strength on the board held by each player, adding up to one,
+        a player's strength falls as their heuristic grows"""
+        strengths = [1 / (1 + heuristic(self.map, p)) if self.map.count_territories(p) else 0.0
+                     for p in self.players]
+        total = sum(strengths)
+        return [strength / total for strength in strengths]
+
+    def score_sum(self) -> float:
+        return 1.0
+
+    def current_player(self) -> int:
+        return self.players.index(self.player)
+
+    def score_bounds(self) -> Tuple[float, float]:
+        return LOSS, 0.0
+
+    def zobrist(self) -> Tuple[int, str, str, int, int]:
+        """Key of the whole search position, the board with exact army counts, whose
+        view it is scored from, who is to move and how far through their turn they are"""
+        return self.map.zobrist(), self.root.name, self.player.name, self.reinforcements, self.attacks_made
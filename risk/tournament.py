@@ -0,0 +1,304 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from itertools import permutations
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import risk.board as board
+from risk.battle_estimator import get_cached_probabilities
+from risk.instrumentation import instrumented, merge_exports, summarise_export
+from risk.risk import play_recorded, setup_game
+
+if TYPE_CHECKING:
+    from risk.board import World
+
+# Tournaments
+#
+# Games are played from seeds, game i of a tournament with seed s is played with
+# seed s + i so any game can be replayed on its own with risk(name, options, s + i).
+# Each game produces a record that is yielded as soon as it finishes and appended
+# as a line of JSON to the tournament log if one is given. The log starts with a
+# header of the seed and the options that decide how games play out, and a
+# tournament restarted with the same log and header yields the games already
+# logged and only plays the rest.
+#
+# With more than one process the games are spread over a pool of workers, each
+# warmed once with the options, the estimator tables and an unplayed board that
+# every game it plays copies. A game may name the agents in each seat, so paired
+# and sprt tournaments play every seat order and batch on the one pool. With the
+# instrument option each record carries the instrumentation export of its game,
+# merged at the end of the tournament.
+#
+# sprt_tournament compares two agents with Wald's sequential probability ratio
+# test, playing batches of games until the challenger's win rate is shown to be
+# p1 or p0 at the error rates alpha and beta, which usually takes far fewer games
+# than a fixed size tournament.
+#
+# Agents are compared on paired games: each seed is replayed with the agents in
+# every seat order. Dealing, the agents' choices and combat roll separate streams
+# of the seed, so every order is dealt exactly the same territories and cards, and
+# the agents' random choices and trial battles do not use up the combat dice. The
+# battles of different orders still stop lining up once the games go different
+# ways, so the pairing removes the luck of the deal and of the opening battles.
+
+PREWARM_TABLE = 50  # estimator table size built before markov games
+UNLOGGED_OPTIONS = ('logging_level', 'instrument', 'replays', 'plot_gameplay')  # leave the games the same
+
+Game = Tuple[int, int, Optional[List[str]]]  # index, seed and the agents in each seat, None for the options'
+
+_worker_options = {}  # type: Dict[str, Any]
+_worker_template = None  # type: Optional[World]
+
+
+def warm_worker(options: Dict[str, Any]) -> None:
+    """Set up a process once before it plays any games"""
+    global _worker_options, _worker_template
+    _worker_options = options
+    _worker_template = board.make_map()
+    if options['markov']:
+        get_cached_probabilities.prewarm(PREWARM_TABLE)
+
+
+def start_worker(options: Dict[str, Any]) -> None:
+    """Warm a pool worker, which logs at the tournament's level"""
+    logging.getLogger().setLevel(options['logging_level'])
+    warm_worker(options)
+
+
+def seat_options(options: Dict[str, Any], order: List[str]) -> Dict[str, Any]:
+    """Options for a game with the agents seated in order, saving its replay
+    in a directory of its own for the order"""
+    seated = dict(options, players=len(order), agents=order)
+    if options.get('replays'):
+        seated['replays'] = os.path.join(options['replays'], ",".join(order))
+    return seated
+
+
+def play_record(game: Game) -> Dict[str, Any]:
+    """Play one game in a warmed process and describe how it went"""
+    i, seed, order = game
+    options = _worker_options if order is None else seat_options(_worker_options, order)
+    map, deck, players = setup_game(options, seed, _worker_template)
+    with instrumented() if options.get('instrument') else nullcontext() as instruments:
+        winner, turns = play_recorded("game {}".format(i), map, deck, players, options, seed)
+    record = {
+        'game': i,
+        'seed': seed,
+        'winner': winner,
+        'turns': turns,
+        'players': {
+            p.name: {
+                'territories': len(map.owned_territories(p)),
+                'armies': sum(t.armies for t in map.owned_territories(p))}
+            for p in players}}  # type: Dict[str, Any]
+    if order is not None:
+        record['agents'] = order
+    if instruments is not None:
+        record['instruments'] = instruments.export()
+    return record
+
+
+def log_header(options: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    """First line of a tournament log, as it reads back from JSON"""
+    logged = {name: value for name, value in sorted(options.items()) if name not in UNLOGGED_OPTIONS}
+    return dict(json.loads(json.dumps({'seed': seed, 'options': logged})))
+
+
+def read_log(path: str) -> List[Dict[str, Any]]:
+    """Header and records in a tournament log, a line cut short by a crash is dropped from the file"""
+    if not os.path.exists(path):
+        return []
+    records = []
+    complete = 0
+    with open(path, 'rb+') as log:
+        for line in log:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            complete += len(line)
+        log.truncate(complete)
+    return records
+
+
+def tournament_records(
+        games: int, options: Dict[str, Any], seed: int = 0,
+        processes: int = 1, log: 'Optional[str]' = None)\
+        -> Iterator[Dict[str, Any]]:
+    """Yield a record for each game as it finishes, starting with any already in the log"""
+    if not log:
+        with game_pool(options, processes) as play:
+            yield from play([(i, seed + i, None) for i in range(games)])
+        return
+    header = log_header(options, seed)
+    logged = read_log(log)
+    if logged and logged[0] != header:
+        raise ValueError("{} is the log of a different tournament".format(log))
+    done = set()
+    for record in logged[1:]:
+        if record['game'] < games:
+            done.add(record['game'])
+            yield record
+    remaining = [(i, seed + i, None) for i in range(games) if i not in done]  # type: List[Game]
+    with open(log, 'a') as out, game_pool(options, processes) as play:
+        if not logged:
+            out.write(json.dumps(header, separators=(',', ':')) + '\n')
+        for record in play(remaining):
+            out.write(json.dumps(record, separators=(',', ':')) + '\n')
+            out.flush()
+            yield record
+
+
+@contextmanager
+def game_pool(options: Dict[str, Any], processes: int)\
+        -> Iterator[Callable[[List[Game]], Iterator[Dict[str, Any]]]]:
+    """Processes warmed once with options, for as many lists of games as are
+    played inside the block, yielding a record for each game as it finishes"""
+    if processes == 1:
+        warm_worker(options)
+        yield lambda games: map(play_record, games)
+        return
+    with multiprocessing.Pool(processes, initializer=start_worker, initargs=(options,)) as pool:
+        def play(games: List[Game]) -> Iterator[Dict[str, Any]]:
+            return pool.imap_unordered(play_record, games, max(1, len(games) // (processes * 4)))
+        yield play
+
+
+def summarise(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Wins and average turns of each winner"""
+    tournament_score = defaultdict(
+        lambda: {'wins': 0, 'avg_turns': 0})  # type: Dict[str, Dict[str, Any]]
+    total_turns = defaultdict(int)  # type: Dict[str, int]
+    for record in records:
+        tournament_score[record['winner']]['wins'] += 1
+        total_turns[record['winner']] += record['turns']
+    for winner, score in tournament_score.items():
+        score['avg_turns'] = total_turns[winner] / score['wins']
+    return tournament_score
+
+
+def parallel_tournament(
+        games: int, options: Dict[str, Any], processes: 'Optional[int]' = None,
+        seed: int = 0, log: 'Optional[str]' = None)\
+        -> Dict[str, Dict[str, Any]]:
+    """Play games across a pool of processes, results are the same as tournament's
+    and do not depend on the number of processes"""
+    start = time.time()
+    records = list(tournament_records(games, options, seed, processes or os.cpu_count() or 1, log))
+    logging.info("{} games in {:.1f}s".format(games, time.time() - start))
+    if options.get('instrument'):
+        print(summarise_export(merge_exports(record['instruments'] for record in records if 'instruments' in record)))
+    return summarise(records)
+
+
+def merged_instruments(exports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Instrumentation of a tournament's games, if they were instrumented"""
+    return {'instruments': merge_exports(exports)} if exports else {}
+
+
+def winning_agent(record: Dict[str, Any]) -> str:
+    """Agent that won a game, or Draw"""
+    return str(record['winner']).rsplit(' ', 1)[0]
+
+
+def seat_orders(agents: List[str]) -> List[List[str]]:
+    """Every distinct way of seating the agents"""
+    return [list(order) for order in sorted(set(permutations(agents)))]
+
+
+def paired_records(
+        agents: List[str], games: int, options: Dict[str, Any], seed: int = 0, processes: int = 1)\
+        -> Iterator[Dict[str, Any]]:
+    """Play each seed once for every seat order, so the agents face the same
+    territory allocation and dice from every seat"""
+    with game_pool(options, processes) as play:
+        yield from play(paired_games(agents, games, seed))
+
+
+def paired_games(agents: List[str], games: int, seed: int = 0, start: int = 0) -> List[Game]:
+    """Games start to start + games, game i seeded with seed + i, in every seat order"""
+    return [(i, seed + i, order) for order in seat_orders(agents) for i in range(start, start + games)]
+
+
+def paired_tournament(
+        agents: List[str], games: int, options: Dict[str, Any], seed: int = 0, processes: int = 1)\
+        -> Dict[str, Any]:
+    """Compare agents over games seeds each played from every seat order, an agent's
+    score on a seed is the share of its orders it won and its standard error is
+    taken over seeds, which removes the luck of the deal and dice shared by the orders"""
+    orders = len(seat_orders(agents))
+    scores = {agent: np.zeros(games) for agent in set(agents)}
+    draws = 0
+    exports = []  # type: List[Dict[str, Any]]
+    for record in paired_records(agents, games, options, seed, processes):
+        if 'instruments' in record:
+            exports.append(record['instruments'])
+        winner = winning_agent(record)
+        if winner in scores:
+            scores[winner][record['game']] += 1 / orders
+        else:
+            draws += 1
+    played = games * orders
+    summary = {}  # type: Dict[str, Dict[str, float]]
+    for agent, score in scores.items():
+        mean = float(score.mean())
+        summary[agent] = {
+            'wins': int(round(score.sum() * orders)),
+            'score': mean,
+            'stderr': float(score.std(ddof=1) / math.sqrt(games)) if games > 1 else math.inf,
+            'unpaired_stderr': math.sqrt(mean * (1 - mean) / played)}
+    return dict({'seeds': games, 'games': played, 'draws': draws, 'agents': summary}, **merged_instruments(exports))
+
+
+def sprt_bounds(alpha: float, beta: float) -> Tuple[float, float]:
+    """Log likelihood ratios at which the test accepts the null and the alternative"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_llr(wins: int, losses: int, p0: float, p1: float) -> float:
+    """Log likelihood ratio of a win rate of p1 over p0"""
+    return wins * math.log(p1 / p0) + losses * math.log((1 - p1) / (1 - p0))
+
+
+def sprt_tournament(
+        challenger: str, opponent: str, options: Dict[str, Any],
+        p0: float = 0.5, p1: float = 0.6, alpha: float = 0.05, beta: float = 0.05,
+        batch: int = 20, max_games: int = 10000, seed: int = 0, processes: int = 1)\
+        -> Dict[str, Any]:
+    """Play the challenger against the opponent in batches until a sequential
+    probability ratio test decides whether it wins at rate p1 (H1) or only p0 (H0),
+    each seed is played from both seats and draws are not counted"""
+    if challenger == opponent:
+        raise ValueError("Both agents are {}".format(challenger))
+    if batch < 2:
+        raise ValueError("A batch of {} games cannot play a seed from both seats".format(batch))
+    lower, upper = sprt_bounds(alpha, beta)
+    wins, losses, draws, games, llr = 0, 0, 0, 0, 0.0
+    result = None  # type: Optional[str]
+    exports = []  # type: List[Dict[str, Any]]
+    with game_pool(options, processes) as play:
+        while result is None and games < max_games:
+            for record in play(paired_games([challenger, opponent], batch // 2, seed, games // 2)):
+                if 'instruments' in record:
+                    exports.append(record['instruments'])
+                winner = winning_agent(record)
+                wins += winner == challenger
+                losses += winner == opponent
+                draws += winner == 'Draw'
+            games += batch // 2 * 2
+            llr = sprt_llr(wins, losses, p0, p1)
+            if llr >= upper:
+                result = 'H1'
+            elif llr <= lower:
+                result = 'H0'
+            logging.info("{} games, {}-{} llr {:.2f}".format(games, wins, losses, llr))
+    return dict(
+        {'games': games, 'wins': wins, 'losses': losses, 'draws': draws, 'llr': llr, 'result': result},
+        **merged_instruments(exports))
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+# Zobrist Hashing
+#
+# Every (territory, owner) and (territory, army bucket) pair gets a random
+# 64 bit key, the hash of a board is the XOR of the keys that apply to it.
+# Changing one territory only needs the old key XORed out and the new one in,
+# so the World can keep its hash up to date as moves are made and undone.
+#
+# Army buckets let nearby positions share an entry, which suits search keys but
+# not caches of exact evaluations. For those every exact army count gets a key
+# of its own, mixed from a key for the territory so no table is needed.
+
+ZOBRIST_SEED = 20200501
+MAX_OWNERS = 64  # key columns for owner ids, column 0 is for no owner
+EXACT_ARMIES = 32  # army counts below this are hashed exactly
+ARMY_BUCKETS = EXACT_ARMIES + 32
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def army_bucket(armies: int) -> int:
+    """Exact buckets for small armies, then buckets doubling in size"""
+    if armies < EXACT_ARMIES:
+        return armies
+    return min(EXACT_ARMIES + armies.bit_length() - EXACT_ARMIES.bit_length(), ARMY_BUCKETS - 1)
+
+
+@lru_cache()
+def zobrist_keys(territories: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Random keys for owners and army buckets of a map with this many territories,
+    the same keys are used by every world of the same size"""
+    rng = np.random.RandomState(ZOBRIST_SEED + territories)
+    high = np.iinfo(np.uint64).max
+    owner_keys = rng.randint(0, high, size=(territories, MAX_OWNERS + 1), dtype=np.uint64)
+    army_keys = rng.randint(0, high, size=(territories, ARMY_BUCKETS), dtype=np.uint64)
+    owner_keys.setflags(write=False)
+    army_keys.setflags(write=False)
+    return owner_keys, army_keys
+
+
+@lru_cache()
+def territory_keys(territories: int) -> Tuple[int, ...]:
+    """Random key for each territory of a map with this many territories, mixed
+    with exact army counts by army_key"""
+    rng = np.random.RandomState(ZOBRIST_SEED - territories)
+    return tuple(rng.randint(0, np.iinfo(np.uint64).max, size=territories, dtype=np.uint64).tolist())
+
+
+def army_key(territory_key: int, armies: int) -> int:
+    """64 bit key for an exact army count on a territory (splitmix64)"""
+    z = (territory_key + (armies + 1) * GOLDEN_GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class TranspositionTable:
+    """Bounded store of evaluated positions, the least recently used entry
+    is dropped when full"""
+    def __init__(self, max_entries: int = 100000) -> None:
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # type: OrderedDict[Hashable, Any]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Look up a position, counting hits and misses"""
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def store(self, key: Hashable, value: Any) -> None:
+        """Save the value of a position"""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits, self.misses = 0, 0
@@ -13,6 +13,8 @@ cat <<ENDHELP
 
        Build commands for "$THISDIR"
 
+           bench:               Run benchmarks and fail on a regression from this machine's baseline
+           bench_save:          Save benchmark results as this machine's baseline
            build:               Build the python
            citest:              Run unit tests
            default:             Same as restore, build, citest, report
@@ -42,6 +44,14 @@ function build_build() {
     )
 }
 
+function build_bench() {
+    python -m risk.benchmark "$@"
+}
+
+function build_bench_save() {
+    python -m risk.benchmark --save "$@"
+}
+
 function build_profile() {
     python -m cProfile -o risk.prof "$PRJDIR/risk.py"
     snakeviz risk.prof
@@ -9,6 +9,7 @@ from risk.player import Player
 def options():
     return {
     'players': 2,
+    'agents': None,  # agent in each seat, None for all Standard
     'stocasticity': True,  # False does not roll dice
     'markov': False,  # If True replaces simulated dice roll with the probable outcomes
     'initial_placement': 'random',  # random|pick
@@ -18,7 +19,9 @@ def options():
     'death_or_glory': True,  # Cannot withdraw after commiting
     'end_of_turn_slide': False,
     'bonus_cards': 'none',  # none|fixed|yes
-    'plot_gameplay': False,  # if True generate graphviz plots in ./output for each turn
+    'plot_gameplay': False,  # True|batch|False graphviz plots of each turn drawn in the background or after the game
+    'instrument': False,  # if True print timings of each phase and agent call after a tournament
+    'replays': None,  # directory to save a replay of every game in
     'logging_level': logging.CRITICAL
     }
 
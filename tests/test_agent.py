@@ -35,3 +35,11 @@ def test_greedy(test_scenario_with_player, options):
 
 def test_human(test_scenario_with_player):
     assert Human(0, "Human")
+
+
+def test_greedy_leaves_map_unchanged(test_scenario_with_player, options):
+    player = Greedy(0, "Greedy")
+    map = test_scenario_with_player(player)
+    before = repr(map)
+    player.attacks(map, options)
+    assert repr(map) == before
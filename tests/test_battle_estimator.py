@@ -1,4 +1,8 @@
-from risk.battle_estimator import probable_outcome, calculate_win_prob, generate_outcome
+from risk.battle_estimator import (
+    probable_outcome, calculate_win_prob, generate_outcome, generate_outcome_table,
+    wrap_probabilities, load_outcome_table, saved_table_sizes, OutcomeCache,
+    outcome_states, alias_table, sample_outcomes, solve_battle, table_bytes)
+import numpy as np
 import pytest
 
 
@@ -136,3 +140,95 @@ def test_generate_outcome():
         assert bool(r[0] == 0) ^ bool(r[1] == 0)
         assert r[0] <= 5
         assert r[1] <= 3
+
+
+def test_generate_outcome_table():
+    table = generate_outcome_table(6, 4)
+    assert table.shape == (7, 5, 10)
+    assert np.allclose(table[1:, 1:].sum(axis=2), 1)
+    states = outcome_states(6, 4)
+    assert states[:5].tolist() == [[0, 4], [0, 3], [0, 2], [0, 1], [1, 0]]
+    # (1, 1) is decided in one round
+    assert round(table[1, 1, 3], 3) == 0.583  # (0, 1)
+    assert round(table[1, 1, 4], 3) == 0.417  # (1, 0)
+    # a smaller table gives the same battles
+    small = generate_outcome_table(3, 2)
+    assert np.allclose(small[3, 2], table[3, 2, 2:7])
+    assert np.allclose(generate_outcome_table(6, 4, previous=small), table)
+
+
+def test_saved_outcome_tables(tmp_path):
+    directory = str(tmp_path)
+    assert load_outcome_table(directory, 5, 3) is None
+    states, probs = wrap_probabilities(directory)(5, 3)
+    assert saved_table_sizes(directory) == [(5, 3)]
+    saved = load_outcome_table(directory, 4, 2)
+    assert isinstance(saved, np.memmap)
+    assert load_outcome_table(directory, 6, 3) is None
+    loaded_states, loaded_probs = wrap_probabilities(directory)(5, 3)
+    assert np.array_equal(loaded_states, states)
+    assert np.allclose(loaded_probs, probs)
+    wrap_probabilities(directory)(9, 3)  # the bigger table replaces the one it covers
+    assert saved_table_sizes(directory) == [(9, 3)]
+
+
+def test_outcome_cache():
+    cache = OutcomeCache(prewarm=4)
+    assert (cache.attackers, cache.defenders, cache.grows) == (4, 4, 1)
+    states, probs = cache(3, 2)
+    assert cache.hits == 1
+    assert states.tolist() == [[0, 2], [0, 1], [1, 0], [2, 0], [3, 0]]
+    assert not probs.flags.writeable and not states.flags.writeable
+    assert np.isclose(probs.sum(), 1)
+
+
+def test_outcome_cache_growth():
+    cache = OutcomeCache(prewarm=4)
+    states, probs = cache(5, 2)  # grows the attackers geometrically
+    assert (cache.attackers, cache.defenders, cache.grows) == (8, 4, 2)
+    fresh_states, fresh_probs = OutcomeCache()(5, 2)
+    assert np.array_equal(states, fresh_states)
+    assert np.allclose(probs, fresh_probs)
+    cache(20, 1)
+    cache(3, 6)
+    assert (cache.attackers, cache.defenders, cache.grows) == (20, 8, 4)
+    assert np.allclose(cache.table, generate_outcome_table(20, 8))
+
+
+def test_solve_battle():
+    table = generate_outcome_table(12, 7)
+    for a, d in [(1, 1), (3, 2), (12, 7), (5, 1), (1, 6)]:
+        states, probs = solve_battle(a, d)
+        assert np.array_equal(states, outcome_states(a, d))
+        assert np.allclose(probs, table[a, d, 7 - d:7 + a])
+
+
+def test_outcome_cache_many_against_one():
+    cache = OutcomeCache(prewarm=50)
+    sizes = (cache.attackers, cache.defenders)
+    for a in range(60, 600, 20):
+        states, probs = cache(a, 1)
+        assert np.isclose(probs.sum(), 1) and len(states) == a + 1
+    # the defenders never grow and past the memory cap battles are solved alone
+    assert cache.defenders == sizes[1] and cache.grows <= 4 and cache.solves > 0
+    assert table_bytes(cache.attackers, cache.defenders) <= cache.max_bytes
+    assert np.allclose(cache(530, 4)[1], solve_battle(530, 4)[1])
+
+
+def test_alias_table():
+    probs = np.array([0.5, 0.0, 0.25, 0.25])
+    accept, alias = alias_table(probs)
+    # each column is picked with probability 1/n then kept or swapped for its alias
+    recovered = np.zeros(4)
+    for i in range(4):
+        recovered[i] += accept[i] / 4
+        recovered[alias[i]] += (1 - accept[i]) / 4
+    assert np.allclose(recovered, probs)
+
+
+def test_sample_outcomes():
+    np.random.seed(0)
+    results = sample_outcomes(5, 3, repeats=20000)
+    assert results.shape == (20000, 2)
+    assert ((results[:, 0] == 0) ^ (results[:, 1] == 0)).all()
+    assert abs((results[:, 1] == 0).mean() - calculate_win_prob(5, 3)) < 0.02
@@ -0,0 +1,36 @@
+from risk.benchmark import (
+    measure, machine_tag, run_benchmarks, regressions, save_baseline, load_baseline, AGENT_MIXES)
+
+
+def test_measure():
+    calls = []
+    assert measure(lambda: calls.append(1), min_time=0, repeats=2) >= 0
+    assert len(calls) == 2
+
+
+def test_run_benchmarks():
+    metrics = run_benchmarks(
+        mixes=[['Standard', 'Passive']], table_sizes=[10], decision_agents=['Greedy'], games=1, min_time=0)
+    assert sorted(metrics) == [
+        'battles_per_second[dice]', 'battles_per_second[markov]', 'decision_seconds[Greedy]',
+        'games_per_second[Standard,Passive]', 'heuristic_per_second', 'table_build_seconds[10]']
+    assert all(value > 0 for value in metrics.values())
+
+
+def test_run_benchmarks_default_mixes():
+    metrics = run_benchmarks(table_sizes=[10], decision_agents=['Passive'], games=2, min_time=0)
+    for mix in AGENT_MIXES:
+        assert metrics['games_per_second[{}]'.format(",".join(mix))] > 0
+
+
+def test_regressions():
+    baseline = {'games_per_second[Standard]': 10.0, 'table_build_seconds[10]': 1.0}
+    assert regressions({'games_per_second[Standard]': 9.0, 'table_build_seconds[10]': 1.1}, baseline) == []
+    assert len(regressions({'games_per_second[Standard]': 7.0, 'table_build_seconds[10]': 0.5}, baseline)) == 1
+    assert len(regressions({'table_build_seconds[10]': 1.5, 'new_seconds': 3.0}, baseline)) == 1
+
+
+def test_baselines(tmp_path):
+    assert load_baseline(str(tmp_path), machine_tag()) == {}
+    save_baseline({'heuristic_per_second': 5.0}, str(tmp_path), machine_tag())
+    assert load_baseline(str(tmp_path), machine_tag()) == {'heuristic_per_second': 5.0}
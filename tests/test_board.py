@@ -1,7 +1,9 @@
 import pytest
 
 from risk.board import World, Territory, make_map
+from risk.dice import DiceStream
 from risk.player import Player
+from risk.transposition import MAX_OWNERS
 
 from fixture_board import test_scenario
 
@@ -55,6 +57,10 @@ def test_count_territories(test_scenario):
     map, players = test_scenario
     assert map.count_territories(players[0]) == 1
     assert map.count_territories(players[1]) == 2
+    map.set_owner(map.get_territory("New Guinea"), players[0])
+    assert map.count_territories(players[0]) == 2
+    assert map.count_territories(players[1]) == 1
+    assert map.count_territories(Player(5, "Stranger")) == 0
 
 def test_territory():
     test_territory = Territory(0, "Fooland", "Baz", (0, 0), [])
@@ -64,3 +70,151 @@ def test_territory():
     assert test_territory.armies == 5
     with pytest.raises(AssertionError):
         test_territory.set_armies(-5)
+
+
+def test_copy_is_independent(test_scenario):
+    map, players = test_scenario
+    clone = map.make_copy()
+    t1 = clone.get_territory("Eastern Australia")
+    clone.set_owner(t1, players[1]).set_armies(t1, 9)
+    assert map.get_territory("Eastern Australia").owner == players[0]
+    assert map.get_territory("Eastern Australia").armies == 5
+    assert clone.count_territories(players[1]) == 3
+    assert map.count_territories(players[1]) == 2
+
+
+def test_adjacency(full_map):
+    indptr, indices = full_map.adjacency()
+    assert len(indptr) == len(full_map.territories) + 1
+    assert len(indices) == sum(len(t.connections) for t in full_map.territories)
+    alaska = full_map.get_territory("Alaska")
+    assert [full_map.territories[i].id for i in indices[indptr[alaska.index]:indptr[alaska.index + 1]]] == [2, 4, 30]
+
+
+def test_territory_view(full_map, two_players):
+    alaska = full_map.get_territory("Alaska")
+    alaska.set_owner(two_players[0])
+    alaska.armies = 3
+    assert full_map.owner_ids[alaska.index] == full_map.player_id(two_players[0])
+    assert full_map.army_counts[alaska.index] == 3
+    with pytest.raises(AssertionError):
+        alaska.set_armies(-1)
+
+
+def test_continent_holder(full_map, two_players):
+    oceania = [t for t in full_map.territories if t.continent == 'Oceania']
+    for t in oceania:
+        full_map.set_owner(t, two_players[0])
+    assert full_map.continent_holder('Oceania') == two_players[0]
+    assert full_map.count_continents(two_players[0]) == 2
+    full_map.set_owner(oceania[0], two_players[1])
+    assert full_map.continent_holder('Oceania') is None
+    assert full_map.calculate_contienent(two_players[0], 'Oceania') == 0
+    assert full_map.count_continents(two_players[1]) == 0
+
+
+def test_rollback(test_scenario):
+    map, players = test_scenario
+    t1 = map.get_territory("Eastern Australia")
+    t2 = map.get_territory("Western Australia")
+    mark = map.checkpoint()
+    map.conquer(players[0], t1, t2, 3)
+    inner = map.checkpoint()
+    map.add_armies(t2, 10)
+    map.rollback(inner)
+    assert t2.owner == players[0] and t2.armies == 4
+    map.rollback(mark)
+    assert t2.owner == players[1] and t2.armies == 1
+    assert t1.armies == 5
+    assert map.count_territories(players[1]) == 2
+
+
+def test_sandbox(test_scenario):
+    map, players = test_scenario
+    t2 = map.get_territory("Western Australia")
+    with map.sandbox():
+        map.set_owner(t2, players[0])
+        assert map.count_territories(players[0]) == 2
+    assert t2.owner == players[1]
+    assert map.count_territories(players[0]) == 1
+
+
+def test_sandbox_rolls_agent_dice(test_scenario):
+    map, players = test_scenario
+    map.dice, map.agent_dice = DiceStream(1), DiceStream(2)
+    combat = map.dice
+    with map.sandbox():
+        assert map.dice is map.agent_dice
+    assert map.dice is combat
+
+
+def test_nested_sandbox(test_scenario):
+    map, players = test_scenario
+    t2 = map.get_territory("Western Australia")
+    with map.sandbox():
+        with map.sandbox():
+            pass
+        map.set_owner(t2, players[0])
+    assert t2.owner == players[1]
+
+
+def test_owned_and_border_territories(test_scenario):
+    map, players = test_scenario
+    assert [t.name for t in map.owned_territories(players[1])] == ["New Guinea", "Western Australia"]
+    assert [t.name for t in map.border_territories(players[1])] == ["New Guinea", "Western Australia"]
+    indonesia = map.get_territory("Indonesia")
+    map.set_owner(indonesia, players[1])
+    assert [t.name for t in map.border_territories(players[1])] == ["Indonesia", "New Guinea", "Western Australia"]
+    map.set_owner(map.get_territory("Eastern Australia"), players[1])
+    assert [t.name for t in map.border_territories(players[1])] == ["Indonesia"]
+    assert map.border_territories(players[0]) == []
+
+
+def test_one_way_border(full_map, two_players):
+    # China connects to Mongolia but not the other way round
+    china, mongolia = full_map.get_territory("China"), full_map.get_territory("Mongolia")
+    for t in full_map.territories:
+        full_map.set_owner(t, two_players[0])
+    assert full_map.border_territories(two_players[0]) == []
+    full_map.set_owner(china, two_players[1])
+    assert mongolia not in full_map.border_territories(two_players[0])
+    full_map.set_owner(mongolia, two_players[1])
+    full_map.set_owner(china, two_players[0])
+    assert china in full_map.border_territories(two_players[0])
+
+
+def test_zobrist(test_scenario):
+    map, players = test_scenario
+    start = map.zobrist()
+    t1 = map.get_territory("Eastern Australia")
+    t2 = map.get_territory("Western Australia")
+    with map.sandbox():
+        map.conquer(players[0], t1, t2, 2)
+        moved = map.zobrist()
+        fresh = map.make_copy()
+        fresh._zobrist = None
+        assert fresh.zobrist() == moved != start
+    assert map.zobrist() == start
+
+
+def test_zobrist_exact_armies(test_scenario):
+    map, players = test_scenario
+    t1 = map.get_territory("Eastern Australia")
+    map.set_armies(t1, 40)
+    exact, bucketed = map.zobrist(), map.zobrist(exact=False)
+    map.set_armies(t1, 60)
+    assert map.zobrist(exact=False) == bucketed
+    assert map.zobrist() != exact
+    fresh = map.make_copy()
+    fresh._zobrist = None
+    assert fresh.zobrist() == map.zobrist()
+    map.set_armies(t1, 40)
+    assert map.zobrist() == exact
+
+
+def test_too_many_players():
+    map = make_map()
+    for i in range(MAX_OWNERS):
+        map.player_id(Player(i, "Player {}".format(i)))
+    with pytest.raises(ValueError):
+        map.player_id(Player(MAX_OWNERS, "One too many"))
@@ -1,5 +1,5 @@
 import numpy as np
-from risk.dice import roll_dice
+from risk.dice import roll_dice, roll_dice_block, DiceStream, game_dice, GLOBAL_DICE
 
 
 def test_roll_dice():
@@ -12,3 +12,34 @@ def test_roll_dice():
 def test_seed():
     np.random.seed(0)
     assert list(roll_dice(3)) == [5, 6, 1]
+
+
+def test_roll_dice_block():
+    results = roll_dice_block(50, 3)
+    assert results.shape == (50, 3)
+    assert ((results > 0) & (results < 7)).all()
+
+
+def test_dice_stream_seed():
+    first, second = DiceStream(7, buffer_size=8), DiceStream(7, buffer_size=8)
+    rolls = [list(first.roll(3)) for _ in range(10)]
+    assert rolls == [list(second.roll(3)) for _ in range(10)]
+    assert all(0 < r < 7 for roll in rolls for r in roll)
+    assert first.choice(['a', 'b', 'c']) == second.choice(['a', 'b', 'c'])
+    assert first.randint(0, 2) == second.randint(0, 2)
+
+
+def test_dice_stream_roll_block():
+    results = DiceStream(0, buffer_size=10).roll_block(50, 3)
+    assert results.shape == (50, 3)
+    assert ((results > 0) & (results < 7)).all()
+
+
+def test_game_dice():
+    deal, agents, combat = game_dice(3)
+    again = game_dice(3)
+    agents.roll(100)  # an agent using numbers does not shift the others
+    assert list(deal.roll(5)) == list(again[0].roll(5))
+    assert list(combat.roll(5)) == list(again[2].roll(5))
+    assert list(deal.roll(20)) != list(combat.roll(20))
+    assert game_dice(None) == (GLOBAL_DICE, GLOBAL_DICE, GLOBAL_DICE)
@@ -0,0 +1,42 @@
+from risk.events import EventStream, EventLog, Attack, BattleResult, Conquest, Deploy, GameOver, TurnStart
+from risk.risk import setup_game
+import risk.rules as rules
+
+from fixture_board import options, test_scenario
+
+
+def test_event_stream():
+    stream = EventStream()
+    everything, attacks = [], []
+    stream.subscribe(everything.append)
+    stream.subscribe(attacks.append, Attack)
+    stream.emit(GameOver("Player 1", 3))
+    assert everything == [GameOver("Player 1", 3)] and attacks == []
+    stream.unsubscribe(everything.append)
+    assert len(stream.subscribers) == 1
+
+
+def test_board_events(test_scenario):
+    map, players = test_scenario
+    events = map.events.subscribe(EventLog())
+    t1, t2 = map.get_territory("Eastern Australia"), map.get_territory("Western Australia")
+    map.add_armies(t1, 2)
+    with map.sandbox():
+        map.add_armies(t1, 2)
+    map.conquer(players[0], t1, t2, 3)
+    assert events.lines == [
+        "Add 2 armies to Eastern Australia",
+        "Western Australia taken over by Player 0",
+        "3 armies moved from Eastern Australia to Western Australia"]
+    assert map.make_copy().events.subscribers == []
+
+
+def test_game_events(options):
+    map, deck, players = setup_game(options, seed=4)
+    events = []
+    map.events.subscribe(events.append, TurnStart, Deploy, Attack, BattleResult, Conquest, GameOver)
+    winner, turns = rules.play_game("Test Game", map, deck, players, options)
+    assert events[-1] == GameOver(winner, turns)
+    kinds = {type(event) for event in events}
+    assert kinds == {TurnStart, Deploy, Attack, BattleResult, Conquest, GameOver}
+    assert sum(isinstance(e, Attack) for e in events) == sum(isinstance(e, BattleResult) for e in events)
@@ -1,4 +1,5 @@
-from risk.heuristic import border_threat, border_security_ratio, heuristic
+from risk.heuristic import border_threat, border_security_ratio, heuristic, cached_heuristic
+from risk.transposition import TranspositionTable
 
 from fixture_board import test_scenario
 
@@ -14,3 +15,21 @@ def test_border_security_ratio(test_scenario):
 def test_heurstic(test_scenario):
     map, players = test_scenario
     assert heuristic(map, players[0]) == (3 / 5) + 2
+
+
+def test_cached_heuristic(test_scenario):
+    map, players = test_scenario
+    table = TranspositionTable()
+    assert cached_heuristic(map, players[0], table) == heuristic(map, players[0])
+    assert cached_heuristic(map, players[0], table) == heuristic(map, players[0])
+    assert table.hits == 1
+
+
+def test_cached_heuristic_exact_armies(test_scenario):
+    map, players = test_scenario
+    table = TranspositionTable()
+    territory = map.get_territory("Eastern Australia")
+    map.set_armies(territory, 40)
+    assert cached_heuristic(map, players[0], table) == heuristic(map, players[0])
+    map.set_armies(territory, 60)
+    assert cached_heuristic(map, players[0], table) == heuristic(map, players[0])
@@ -0,0 +1,76 @@
+import risk.rules as rules
+from risk.events import Attack
+from risk.instrumentation import Histogram, instrumented, merge_exports
+from risk.risk import risk, setup_game, tournament
+from risk.tournament import parallel_tournament, paired_tournament
+
+from fixture_board import options
+
+
+def test_histogram():
+    histogram = Histogram()
+    for seconds in (0.5e-6, 3e-6, 4e-6, 1e-3):
+        histogram.add(seconds)
+    exported = histogram.export()
+    assert exported['count'] == 4
+    assert exported['max'] == 1e-3
+    assert exported['histogram'] == {'<=1us': 1, '<=4us': 2, '<=1024us': 1}
+
+
+def test_instrumented(options):
+    assert rules.instrumentation is None
+    with instrumented() as instruments:
+        winner = risk("Test Game", options, seed=2)
+    assert rules.instrumentation is None
+    assert winner == risk("Test Game", options, seed=2)
+    report = instruments.export()
+    assert report['counters']['games'] == 1
+    assert report['counters']['turns'] == winner[1] - 1
+    assert report['counters']['rounds_rolled'] >= report['counters']['battles'] > 0
+    for name in ('turn', 'deployment', 'combat', 'deploy', 'attacks', 'attack_commit'):
+        assert set(report['timings'][name]) == {'Standard 0', 'Standard 1'}
+    assert report['timings']['deploy']['Standard 0']['count'] == report['timings']['deployment']['Standard 0']['count']
+
+
+def test_tournament_summary(options, capsys):
+    options['instrument'] = True
+    tournament(1, options)
+    assert "battles" in capsys.readouterr().out
+
+
+def test_merge_exports(options):
+    exports = []
+    for seed in range(2):
+        with instrumented() as instruments:
+            risk("Test Game", options, seed=seed)
+        exports.append(instruments.export())
+    merged = merge_exports(exports)
+    assert merged['counters']['games'] == 2
+    assert merged['counters']['battles'] == sum(e['counters']['battles'] for e in exports)
+    deploys = [e['timings']['deploy']['Standard 0'] for e in exports]
+    merged_deploys = merged['timings']['deploy']['Standard 0']
+    assert merged_deploys['count'] == sum(d['count'] for d in deploys)
+    assert merged_deploys['max'] == max(d['max'] for d in deploys)
+    assert sum(merged_deploys['histogram'].values()) == merged_deploys['count']
+
+
+def test_parallel_instruments(options, capsys):
+    options['instrument'] = True
+    parallel_tournament(2, options, processes=2, seed=3)
+    assert "battles" in capsys.readouterr().out
+    result = paired_tournament(['Standard', 'Passive'], 2, options, seed=3, processes=2)
+    assert result['instruments']['counters']['games'] == 4
+
+
+def test_sandbox_battles_not_counted(options):
+    options['agents'] = ['Greedy', 'Standard']
+    options['players'] = 2
+    map, deck, players = setup_game(options, seed=1)
+    attacks = []
+    map.events.subscribe(attacks.append, Attack)
+    with instrumented() as instruments:
+        rules.play_game("Test Game", map, deck, players, options)
+    report = instruments.export()
+    assert report['counters']['battles'] == len(attacks)
+    assert report['timings']['attack_commit']['Greedy 0']['count'] == sum(
+        1 for attack in attacks if attack.player is players[0])
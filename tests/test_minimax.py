@@ -1,4 +1,8 @@
-from risk.minimax import Minimax
+import random
+
+import pytest
+
+from risk.minimax import Minimax, Expectiminimax, MaxN, Paranoid, prune_outcomes
 
 # from wikipedia, this tree should have some alpha-beta pruning
 tree = [
@@ -44,17 +48,245 @@ class GameState():
         return range(len(self.tree))
 
     def is_gameover(self):
-        return type(self.tree) == int
+        return type(self.tree) != list
 
     def evaluate(self):
-        if type(self.tree) == int:
+        if type(self.tree) != list:
             return self.tree
         else:
             return float("inf")  # no heurstic for this
 
 
+def full_minimax(tree, maximising=True):
+    if type(tree) != list:
+        return tree
+    scores = [full_minimax(t, not maximising) for t in tree]
+    return max(scores) if maximising else min(scores)
+
+
+def random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.1:
+        return rng.randint(-20, 20)
+    return [random_tree(rng, depth - 1) for _ in range(rng.randint(1, 4))]
+
+
+def count_nodes(tree):
+    return 1 if type(tree) == int else 1 + sum(count_nodes(t) for t in tree)
+
+
 def test_minimax():
-    # game_state = GameState(tree)
-    Minimax(100, 100)
-    # result = minimax.find_best(game_state)
-#     assert result == (0, (1, (0, (0, 3))))
+    minimax = Minimax(100, 100)
+    result = minimax.find_best(GameState(tree))
+    assert result == (1, 6)
+    assert minimax.stats['depth'] == 4
+    assert minimax.stats['cutoff_rate'] > 0
+
+
+def test_minimax_random_trees():
+    rng = random.Random(0)
+    for _ in range(50):
+        t = random_tree(rng, 6)
+        if type(t) == int:
+            continue
+        minimax = Minimax(6, 100)
+        move, score = minimax.find_best(GameState(t))
+        assert score == full_minimax(t)
+        assert full_minimax(t[move], False) == score
+
+
+def scale_tree(tree, f):
+    return f(tree) if type(tree) == int else [scale_tree(t, f) for t in tree]
+
+
+def test_minimax_large_and_infinite_scores():
+    rng = random.Random(6)
+    for _ in range(50):
+        t = random_tree(rng, 5)
+        if type(t) == int:
+            continue
+        for f in (lambda v: 1e12 + v, lambda v: float("inf") * v if abs(v) > 15 else v):
+            scaled = scale_tree(t, f)
+            move, score = Minimax(5, 100).find_best(GameState(scaled))
+            assert score == full_minimax(scaled)
+            assert full_minimax(scaled[move], False) == score
+
+
+def test_minimax_prunes():
+    rng = random.Random(1)
+    t = [[[[rng.randint(0, 100) for _ in range(4)] for _ in range(4)] for _ in range(4)] for _ in range(4)]
+    minimax = Minimax(4, 100)
+    assert minimax.find_best(GameState(t))[1] == full_minimax(t)
+    assert minimax.stats['nodes'] < count_nodes(t)
+
+
+def test_minimax_out_of_time():
+    minimax = Minimax(100, 0)
+    move, score = minimax.find_best(GameState(tree))
+    assert move in range(3)
+
+
+class Chance():
+    """Chance node of a fake game tree, outcomes are (probability, subtree) pairs"""
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+
+class ChanceGameState(GameState):
+    """Fake game state where some moves lead to chance nodes"""
+    def next_state(self, move, outcome=None):
+        child = self.tree[move]
+        return ChanceGameState(child.outcomes[outcome][1] if outcome is not None else child)
+
+    def chance_outcomes(self, move):
+        child = self.tree[move]
+        if type(child) != Chance:
+            return []
+        return [(probability, i) for i, (probability, _) in enumerate(child.outcomes)]
+
+    def score_bounds(self):
+        return -20, 20
+
+
+def full_expectiminimax(tree, maximising=True):
+    if type(tree) == int:
+        return tree
+    scores = [
+        sum(p * full_expectiminimax(t, not maximising) for p, t in child.outcomes) if type(child) == Chance
+        else full_expectiminimax(child, not maximising)
+        for child in tree]
+    return max(scores) if maximising else min(scores)
+
+
+def random_chance_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.1:
+        return rng.randint(-20, 20)
+    children = []
+    for _ in range(rng.randint(1, 3)):
+        if rng.random() < 0.5:
+            weights = [rng.random() + 0.01 for _ in range(rng.randint(1, 3))]
+            children.append(Chance([(w / sum(weights), random_chance_tree(rng, depth - 1)) for w in weights]))
+        else:
+            children.append(random_chance_tree(rng, depth - 1))
+    return children
+
+
+def test_prune_outcomes():
+    outcomes = [(0.005, 'c'), (0.6, 'a'), (0.395, 'b')]
+    assert prune_outcomes(outcomes, 0.01) == [(0.6 / 0.995, 'a'), (0.395 / 0.995, 'b')]
+    assert [o for _, o in prune_outcomes(outcomes, 0)] == ['a', 'b', 'c']
+
+
+def test_expectiminimax_random_trees():
+    rng = random.Random(2)
+    for probe in (True, False):
+        for _ in range(50):
+            t = random_chance_tree(rng, 5)
+            if type(t) == int:
+                continue
+            expectiminimax = Expectiminimax(5, 100, mass_threshold=0, probe=probe)
+            move, score = expectiminimax.find_best(ChanceGameState(t))
+            assert score == pytest.approx(full_expectiminimax(t))
+
+
+def test_expectiminimax_without_chance():
+    expectiminimax = Expectiminimax(100, 100)
+    assert expectiminimax.find_best(ChanceGameState(tree)) == (1, 6)
+    assert expectiminimax.stats['chance_nodes'] == 0
+
+
+class Node():
+    """Node of a fake game tree for more than two players, leaves are tuples of scores"""
+    def __init__(self, player, children):
+        self.player = player
+        self.children = children
+
+
+class MultiGameState():
+    """Fake game state for more than two players"""
+    def __init__(self, tree, root=0):
+        self.tree = tree
+        self.root = root
+
+    def next_state(self, move):
+        return MultiGameState(self.tree.children[move], self.root)
+
+    def get_available_moves(self):
+        return range(len(self.tree.children))
+
+    def is_gameover(self):
+        return type(self.tree) == tuple
+
+    def current_player(self):
+        return self.tree.player if type(self.tree) == Node else -1
+
+    def evaluate(self):
+        return self.evaluate_all()[self.root]
+
+    def evaluate_all(self):
+        tree = self.tree
+        while type(tree) == Node:  # the first leaf is the heuristic of a node
+            tree = tree.children[0]
+        return tree
+
+    def score_sum(self):
+        return 1.0
+
+
+def random_multi_tree(rng, depth, players, player=0):
+    if depth == 0 or rng.random() < 0.1:
+        weights = [rng.random() for _ in range(players)]
+        return tuple(w / sum(weights) for w in weights)
+    # sometimes a player moves twice in a row
+    following = player if rng.random() < 0.2 else (player + 1) % players
+    return Node(player, [random_multi_tree(rng, depth - 1, players, following) for _ in range(rng.randint(1, 4))])
+
+
+def full_max_n(tree):
+    if type(tree) == tuple:
+        return tree
+    best = None
+    for child in tree.children:
+        scores = full_max_n(child)
+        if best is None or scores[tree.player] > best[tree.player]:
+            best = scores
+    return best
+
+
+def full_paranoid(tree, root=0):
+    if type(tree) == tuple:
+        return tree[root]
+    scores = [full_paranoid(child, root) for child in tree.children]
+    return max(scores) if tree.player == root else min(scores)
+
+
+def test_max_n_random_trees():
+    rng = random.Random(3)
+    for _ in range(50):
+        t = random_multi_tree(rng, 6, 3)
+        if type(t) == tuple:
+            continue
+        max_n = MaxN(6, 100)
+        move, scores = max_n.find_best(MultiGameState(t))
+        assert scores == full_max_n(t)
+        assert full_max_n(t.children[move]) == scores
+
+
+def test_max_n_shallow_pruning():
+    t = Node(0, [
+        Node(1, [(0.8, 0.1, 0.1), (0.5, 0.3, 0.2)]),
+        Node(1, [(0.1, 0.8, 0.1), (0.6, 0.2, 0.2)]),  # player 1 is sure of 0.8, leaving player 0 at most 0.2
+    ])
+    max_n = MaxN(2, 100)
+    assert max_n.find_best(MultiGameState(t)) == (0, (0.5, 0.3, 0.2))
+    assert max_n.stats['cutoff_rate'] > 0
+
+
+def test_paranoid_random_trees():
+    rng = random.Random(5)
+    for _ in range(50):
+        t = random_multi_tree(rng, 6, 4)
+        if type(t) == tuple:
+            continue
+        move, score = Paranoid(6, 100).find_best(MultiGameState(t))
+        assert score == full_paranoid(t)
+        assert full_paranoid(t.children[move]) == score
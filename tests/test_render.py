@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+import risk.render as render
+import risk.rules as rules
+from risk.render import RenderPool, layout, snapshot, render_game
+from risk.risk import setup_game
+
+from fixture_board import options, test_scenario
+
+
+def test_snapshot(test_scenario):
+    map, players = test_scenario
+    board = layout(map)
+    assert board.names[0] == "Alaska" and board.positions[0] == "0,0!"
+    assert (0, 1) in board.edges
+    s = snapshot(map, "map-1", "label")
+    t1 = map.get_territory("Eastern Australia")
+    assert s.owners[t1.index] == players[0].index and s.armies[t1.index] == t1.armies
+    assert s.owners[0] == -1
+
+
+def test_render_pool(test_scenario):
+    map, _ = test_scenario
+    drawn, started, release = [], threading.Event(), threading.Event()
+
+    def slow_render(board, s):
+        started.set()
+        release.wait()
+        drawn.append(s.name)
+    pool = RenderPool(layout(map), workers=1, max_pending=1, render=slow_render)
+    pool.submit(snapshot(map, "first", ""))
+    started.wait()
+    blocked = threading.Thread(target=pool.submit, args=(snapshot(map, "second", ""),))
+    blocked.start()
+    blocked.join(0.05)
+    assert blocked.is_alive()  # held up until the first is drawn
+    release.set()
+    blocked.join()
+    pool.close()
+    assert drawn == ["first", "second"]
+
+
+def test_render_errors(test_scenario):
+    map, _ = test_scenario
+
+    def broken(board, s):
+        raise RuntimeError("no neato")
+    with pytest.raises(RuntimeError):
+        render_game(layout(map), [snapshot(map, "first", "")], render=broken)
+
+
+@pytest.mark.parametrize("mode", [True, 'batch'])
+def test_plot_gameplay(options, monkeypatch, mode):
+    drawn = []
+    monkeypatch.setattr(render, 'render_snapshot', lambda board, s: drawn.append(s))
+    options['plot_gameplay'] = mode
+    map, deck, players = setup_game(options, seed=1)
+    winner, turns = rules.play_game("Test Game", map, deck, players, options)
+    first = {s.name: s for s in drawn}["map-Test Game-1-0"]
+    assert "standard 0's turn" in first.description
+    assert len(drawn) >= 2 * (turns - 2)
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from risk.board import World
+from risk.events import TurnStart
+from risk.replay import Replay, ReplayRecorder, RECORD
+from risk.risk import setup_game, risk, tournament
+from risk.tournament import parallel_tournament, paired_records
+import risk.rules as rules
+
+from fixture_board import options
+
+
+def board_state(map):
+    return [(t.owner.name if t.owner else None, t.armies) for t in map.territories]
+
+
+@pytest.mark.parametrize("markov", [False, True])
+def test_replay(options, tmp_path, markov):
+    options['markov'] = markov
+    map, deck, players = setup_game(options, seed=8)
+    recorder = ReplayRecorder(map, seed=8, keyframe_interval=3)
+    map.events.subscribe(recorder)
+    starts = {}
+
+    def remember(event):
+        starts.setdefault(event.turn, board_state(map))
+    map.events.subscribe(remember, TurnStart)
+    winner, turns = rules.play_game("Test Game", map, deck, players, options)
+    path = str(tmp_path / "game.replay")
+    recorder.save(path)
+    replay = Replay.load(path)
+    assert replay.seed == 8
+    assert replay.names == ["Standard 0", "Standard 1"]
+    assert replay.turns == turns and replay.winner() == winner
+    assert len(replay.keyframes) == (turns - 2) // 3 + 1
+    assert os.path.getsize(path) < 100 + len(replay.records) * RECORD.itemsize + len(replay.keyframes) * 260
+    for turn, state in starts.items():
+        assert board_state(replay.world_at(turn)[0]) == state
+    final, final_players = replay.world_at()
+    assert board_state(final) == board_state(map)
+    assert [p.in_game for p in final_players] == [p.in_game for p in players]
+
+
+def test_replay_option(options, tmp_path):
+    options['replays'] = str(tmp_path / "replays")
+    winner, turns = risk("Game 1", options, seed=3)
+    replay = Replay.load(str(tmp_path / "replays" / "Game 1.replay"))
+    assert (replay.winner(), replay.turns) == (winner, turns)
+    assert replay.territories == 42
+
+
+def test_tournament_replays(options, tmp_path):
+    options['replays'] = str(tmp_path / "serial")
+    tournament(2, options, seed=4)
+    options['replays'] = str(tmp_path / "parallel")
+    parallel_tournament(2, options, processes=2, seed=4)
+    for i in range(2):
+        serial = Replay.load(str(tmp_path / "serial" / "game {}.replay".format(i)))
+        parallel = Replay.load(str(tmp_path / "parallel" / "game {}.replay".format(i)))
+        assert serial.seed == parallel.seed == 4 + i
+        assert (serial.winner(), serial.turns) == (parallel.winner(), parallel.turns)
+
+
+def test_paired_replays(options, tmp_path):
+    options['replays'] = str(tmp_path)
+    records = list(paired_records(['Standard', 'Passive'], 1, options, seed=2))
+    for record in records:
+        replay = Replay.load(str(tmp_path / ",".join(record['agents']) / "game 0.replay"))
+        assert (replay.seed, replay.winner()) == (2, record['winner'])
+
+
+def test_replay_other_map(options, tmp_path):
+    options['replays'] = str(tmp_path)
+    risk("Game 1", options, seed=3)
+    replay = Replay.load(str(tmp_path / "Game 1.replay"))
+
+    def small_map():
+        map = World()
+        map.set_continent_army_value('Island', 1)
+        map.make_territory(1, 'North', 'Island', (0, 0), [2])
+        map.make_territory(2, 'South', 'Island', (0, -1), [1])
+        return map
+    with pytest.raises(ValueError):
+        replay.world_at(make_map=small_map)
+
+
+def test_replay_cut_short(options, tmp_path):
+    options['replays'] = str(tmp_path)
+    risk("Game 1", options, seed=3)
+    path = tmp_path / "Game 1.replay"
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        Replay.load(str(path))
@@ -11,14 +11,12 @@ from fixture_board import options
 def test_risk(options):
     random.seed(0)
     np.random.seed(0)
-    assert risk("Test Game", options) == ('Standard 0', 20)
+    assert risk("Test Game", options) == ('Standard 0', 24)
 
 
 def test_tournament(options):
-    random.seed(0)
-    np.random.seed(0)
     r = tournament(3, options)
-    assert dict(r) == {'Standard 0': {'wins': 2, 'avg_turns': 26.0}, 'Standard 1': {'wins': 1, 'avg_turns': 24.0}}
+    assert dict(r) == {'Standard 0': {'wins': 2, 'avg_turns': 16.5}, 'Standard 1': {'wins': 1, 'avg_turns': 29.0}}
 
 def test_risk_less_random(options):
     random.seed(0)
@@ -31,7 +29,7 @@ def test_risk_extra_start(options):
     random.seed(0)
     np.random.seed(0)
     options['extra_start_deployment'] = True
-    assert risk("Test Game", options) == ('Standard 0', 15)
+    assert risk("Test Game", options) == ('Standard 0', 18)
 
 
 def test_risk_bonus_cards(options):
@@ -45,4 +43,13 @@ def test_risk_bonus_cards(options):
     random.seed(0)
     np.random.seed(0)
     options['players'] = 3
-    assert risk("Test Game", options) == ('Standard 2', 24)
+    assert risk("Test Game", options) == ('Standard 1', 27)
+
+
+def test_risk_seed(options):
+    options['bonus_cards'] = 'yes'
+    random.seed(0)
+    first = risk("Test Game", options, seed=3)
+    random.seed(1)
+    np.random.seed(1)
+    assert risk("Test Game", options, seed=3) == first
@@ -4,8 +4,9 @@ import pytest
 import numpy as np
 
 from risk.cards import CardDeck, Card
+from risk.instrumentation import instrumented
 from risk.rules import (
-    summary, check_players, active_players, combat, slide, draw_card, attack)
+    summary, check_players, active_players, combat, slide, draw_card, attack, battle_losses, ROUND_BLOCK)
 
 from fixture_board import test_scenario, options
 
@@ -44,7 +45,59 @@ def test_attack(test_scenario, options):
     assert attack(map, players[0], options, t1, t2) == True
     # Check the attack was a success
     assert t2.owner == players[0]
-    assert t2.armies == 4
+    assert t2.armies == 2
+
+
+def test_attack_withdraw(test_scenario, options):
+    map, players = test_scenario
+    t1 = map.get_territory("Eastern Australia")
+    t3 = map.get_territory("New Guinea")
+    map.set_armies(t3, 5)
+    options['death_or_glory'] = False
+    rounds = []
+    players[0].attack_commit = lambda x, y, z: 4
+    players[0].attack_continue = lambda x, y, z: not rounds and not rounds.append(1)  # one round only
+    with instrumented() as instruments:
+        attack(map, players[0], options, t1, t3)
+    assert len(rounds) == 1
+    assert (5 - t1.armies) + (5 - t3.armies) == 2
+    assert instruments.export()['counters']['rounds_rolled'] == ROUND_BLOCK
+
+
+def test_attack_withdraw_long_battle(test_scenario, options):
+    map, players = test_scenario
+    t1 = map.get_territory("Eastern Australia")
+    t3 = map.get_territory("New Guinea")
+    map.set_armies(t1, 40)
+    map.set_armies(t3, 30)
+    options['death_or_glory'] = False
+    players[0].attack_commit = lambda x, y, z: 39
+    players[0].attack_continue = lambda x, y, z: True
+    players[0].attack_move = lambda x, y, z: 1
+    with instrumented() as instruments:
+        attack(map, players[0], options, t1, t3)
+    conquered = t3.owner == players[0]
+    assert t1.armies == 1 or conquered
+    losses = (40 - t1.armies - (t3.armies if conquered else 0)) + (30 if conquered else 30 - t3.armies)
+    # every round kills one or two armies and the blocks at most double the rounds played
+    assert losses // 2 <= instruments.export()['counters']['rounds_rolled'] <= 2 * losses + ROUND_BLOCK
+
+
+def test_battle_losses():
+    np.random.seed(0)
+    for _ in range(100):
+        defender_losses, attacker_losses = battle_losses(3, 10, 6)
+        assert defender_losses == 6 or attacker_losses >= 9
+        assert 0 <= defender_losses <= 6 and 0 <= attacker_losses <= 10
+    wins = sum(battle_losses(1, 2, 1)[0] for _ in range(5000))
+    assert abs(wins / 5000 - 0.417) < 0.03
+
+def test_battle_losses_keep_one_attacker():
+    np.random.seed(0)
+    for _ in range(200):
+        defender_losses, attacker_losses = battle_losses(3, 2, 5)
+        assert attacker_losses <= 1
+
 
 def test_combat_fixed():
     assert combat(3, 1, {'stocasticity': False}) == (1, 1)
@@ -0,0 +1,173 @@
+import pytest
+
+from risk.board import make_map
+from risk.minimax import Minimax, Expectiminimax, MaxN, Paranoid
+from risk.player import Player
+from risk.search_state import RiskState, END_TURN, DEPLOY, ATTACK, likely_outcome, commit_levels
+from risk.transposition import TranspositionTable
+
+from fixture_board import test_scenario
+
+
+def board_state(map):
+    return map.owner_ids.tolist(), map.army_counts.tolist()
+
+
+def test_likely_outcome():
+    assert likely_outcome(10, 1) == (10, 0)
+    assert likely_outcome(1, 10) == (0, 10)
+
+
+def test_commit_levels():
+    assert commit_levels(2) == [0]
+    assert commit_levels(11) == [0, 1]
+
+
+def test_moves(test_scenario):
+    map, players = test_scenario
+    east = map.get_territory("Eastern Australia").index
+    west = map.get_territory("Western Australia").index
+    state = RiskState(map, players, players[0], reinforcements=3)
+    assert state.get_available_moves() == [state.encode_deploy(east)]
+    state.next_state(state.encode_deploy(east))
+    moves = state.get_available_moves()
+    assert moves[-1] == END_TURN
+    assert state.encode_attack(east, west) in moves
+    assert {state.decode(move)[0] for move in moves[:-1]} == {ATTACK}
+    assert state.decode(state.encode_attack(east, west, 1)) == (ATTACK, east, west, 1)
+    assert state.decode(state.encode_deploy(east)) == (DEPLOY, -1, east, 0)
+
+
+def test_next_state_and_undo(test_scenario):
+    map, players = test_scenario
+    before = board_state(map)
+    east = map.get_territory("Eastern Australia")
+    west = map.get_territory("Western Australia")
+    state = RiskState(map, players, players[0], reinforcements=3)
+    state.next_state(state.encode_deploy(east.index))
+    assert east.armies == 8
+    state.next_state(state.encode_attack(east.index, west.index))
+    assert west.owner is players[0]
+    assert state.attacks_made == 1
+    attacked = state.zobrist()
+    state.next_state(END_TURN)
+    assert state.player is players[1]
+    assert state.zobrist() != attacked  # same board, other player to move
+    assert not state.is_maximising()
+    state.undo()
+    state.undo()
+    deployed = state.zobrist()
+    state.undo()
+    assert board_state(map) == before
+    state.next_state(state.encode_deploy(east.index))
+    assert state.zobrist() == deployed
+    state.undo()
+    assert state.zobrist() != deployed
+    assert state.player is players[0] and state.reinforcements == 3
+
+
+def test_gameover(test_scenario):
+    map, players = test_scenario
+    for name in ("Western Australia", "New Guinea"):
+        map.set_owner(map.get_territory(name), players[0])
+    state = RiskState(map, players, players[0], reinforcements=3)
+    assert state.is_gameover()
+    assert state.get_available_moves() == []
+    assert state.evaluate() == state.score_bounds()[1]
+
+
+def test_search_scenario(test_scenario):
+    map, players = test_scenario
+    before = board_state(map)
+    state = RiskState(map, players, players[0], reinforcements=3)
+    minimax = Minimax(2, 100)
+    with map.sandbox():
+        move, score = minimax.find_best(state)
+    assert state.decode(move)[0] == DEPLOY
+    assert board_state(map) == before
+    state.next_state(move)
+    with map.sandbox():
+        move, score = minimax.find_best(state)
+    kind, source, target, _ = state.decode(move)
+    assert kind == ATTACK and source == map.get_territory("Eastern Australia").index
+
+
+def full_board():
+    players = [Player(i, "Player {}".format(i)) for i in range(3)]
+    map = make_map()
+    map.allocate_territories(players)
+    for territory in map.territories:
+        map.add_armies(territory, 2)
+    return map, players
+
+
+def test_search_full_board():
+    map, players = full_board()
+    before = board_state(map)
+    state = RiskState(map, players, players[0])
+    minimax = Minimax(2, 100)
+    with map.sandbox():
+        move, score = minimax.find_best(state)
+    assert move in state.get_available_moves()
+    assert minimax.stats['nodes'] > 100
+    assert board_state(map) == before
+    assert state.player is players[0] and state.attacks_made == 0
+
+
+def test_search_out_of_time_restores_board():
+    map, players = full_board()
+    before = board_state(map)
+    state = RiskState(map, players, players[0])
+    reinforcements = state.reinforcements
+    Minimax(4, 0.05).find_best(state)
+    assert board_state(map) == before
+    assert state.player is players[0] and state.reinforcements == reinforcements
+
+
+def test_chance_outcomes(test_scenario):
+    map, players = test_scenario
+    east = map.get_territory("Eastern Australia")
+    west = map.get_territory("Western Australia")
+    state = RiskState(map, players, players[0], reinforcements=0)
+    assert state.chance_outcomes(END_TURN) == ()
+    outcomes = state.chance_outcomes(state.encode_attack(east.index, west.index))
+    assert sum(p for p, _ in outcomes) == pytest.approx(1)
+    assert [p for p, _ in outcomes] == sorted((p for p, _ in outcomes), reverse=True)
+    state.next_state(state.encode_attack(east.index, west.index), (0, 1))
+    assert (east.armies, west.armies, west.owner) == (1, 1, players[1])
+    state.undo()
+    assert (east.armies, west.armies) == (5, 1)
+
+
+def test_expectiminimax_full_board():
+    map, players = full_board()
+    before = board_state(map)
+    state = RiskState(map, players, players[0], reinforcements=0)
+    expectiminimax = Expectiminimax(1, 100, table=TranspositionTable())
+    with map.sandbox():
+        move, score = expectiminimax.find_best(state)
+    assert state.decode(move)[0] in (ATTACK, END_TURN)
+    assert expectiminimax.stats['chance_nodes'] > 0
+    assert expectiminimax.stats['chance_cutoff_rate'] > 0
+    assert board_state(map) == before
+
+
+def test_evaluate_all(test_scenario):
+    map, players = test_scenario
+    state = RiskState(map, players, players[0], reinforcements=3)
+    scores = state.evaluate_all()
+    assert sum(scores) == pytest.approx(state.score_sum())
+    assert scores[0] > scores[1]
+    state.next_state(END_TURN)
+    assert state.current_player() == 1
+
+
+def test_multi_player_search_full_board():
+    map, players = full_board()
+    before = board_state(map)
+    for search in (MaxN(2, 100), Paranoid(2, 100)):
+        state = RiskState(map, players, players[0], max_attacks=1)
+        with map.sandbox():
+            move, score = search.find_best(state)
+        assert state.decode(move)[0] == DEPLOY
+        assert board_state(map) == before
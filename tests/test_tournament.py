@@ -0,0 +1,108 @@
+from collections import defaultdict
+from itertools import islice
+import logging
+
+import pytest
+
+import risk.tournament as tournament
+from risk.risk import risk, record_result
+from risk.tournament import (
+    parallel_tournament, tournament_records, read_log, summarise, sprt_bounds, sprt_llr, sprt_tournament,
+    seat_orders, paired_records, paired_tournament)
+
+from fixture_board import options
+
+
+def test_parallel_tournament(options):
+    expected = defaultdict(lambda: {'wins': 0, 'avg_turns': 0})
+    for i in range(4):
+        record_result(expected, *risk("game {}".format(i), options, 10 + i))
+    assert dict(parallel_tournament(4, options, processes=2, seed=10)) == dict(expected)
+    assert dict(parallel_tournament(4, options, processes=1, seed=10)) == dict(expected)
+
+
+def test_serial_tournament_keeps_logging_level(options):
+    root = logging.getLogger()
+    level = root.level
+    options['logging_level'] = logging.DEBUG if level != logging.DEBUG else logging.WARNING
+    list(tournament_records(1, options))
+    assert root.level == level
+
+
+def test_tournament_records(options):
+    records = list(tournament_records(3, options, seed=5))
+    assert [r['game'] for r in records] == [0, 1, 2]
+    assert [(r['winner'], r['turns']) for r in records] == [risk("", options, 5 + i) for i in range(3)]
+    winner = records[0]['players'][records[0]['winner']]
+    assert winner['territories'] == 42 and winner['armies'] >= 42
+    assert summarise(records)[records[0]['winner']]['wins'] >= 1
+
+
+def test_tournament_resume(options, tmp_path):
+    log = str(tmp_path / "games.jsonl")
+    played = list(islice(tournament_records(4, options, seed=5, log=log), 2))
+    with open(log, 'a') as f:
+        f.write('{"game": 2, "se')  # crashed mid write
+    assert read_log(log)[1:] == played
+    resumed = list(tournament_records(4, options, seed=5, log=log))
+    assert resumed[:2] == played
+    assert resumed == list(tournament_records(4, options, seed=5))
+    assert read_log(log)[1:] == resumed
+    assert list(tournament_records(3, options, seed=5, log=log)) == resumed[:3]
+    options['logging_level'] = logging.DEBUG  # does not change the games
+    assert list(tournament_records(4, options, seed=5, log=log)) == resumed
+    with pytest.raises(ValueError):
+        list(tournament_records(4, options, seed=6, log=log))
+    with pytest.raises(ValueError):
+        list(tournament_records(4, dict(options, agents=['Greedy', 'Standard']), seed=5, log=log))
+
+
+def test_sprt_bounds():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(-2.944, abs=1e-3) and upper == pytest.approx(2.944, abs=1e-3)
+    assert sprt_llr(20, 0, 0.5, 0.6) > upper
+    assert sprt_llr(0, 20, 0.5, 0.6) < lower
+
+
+def test_sprt_tournament(options):
+    result = sprt_tournament('Standard', 'Passive', options, batch=4, seed=1)
+    assert result['result'] == 'H1'
+    assert result['wins'] == result['games'] < 50
+    result = sprt_tournament('Passive', 'Standard', options, batch=4, seed=1)
+    assert result['result'] == 'H0'
+    with pytest.raises(ValueError):
+        sprt_tournament('Standard', 'Standard', options)
+    with pytest.raises(ValueError):
+        sprt_tournament('Standard', 'Passive', options, batch=1)
+
+
+def test_one_pool_per_comparison(options, monkeypatch):
+    warmed = []
+    warm_worker = tournament.warm_worker
+    monkeypatch.setattr(tournament, 'warm_worker', lambda options: warmed.append(1) or warm_worker(options))
+    result = sprt_tournament('Standard', 'Passive', options, batch=4, seed=1)
+    assert result['games'] > 4 and len(warmed) == 1
+    paired_tournament(['Standard', 'Passive'], 2, options, seed=3)
+    assert len(warmed) == 2
+
+
+def test_seat_orders():
+    assert seat_orders(['A', 'B']) == [['A', 'B'], ['B', 'A']]
+    assert len(seat_orders(['A', 'B', 'B'])) == 3
+
+
+def test_paired_records(options):
+    records = list(paired_records(['Standard', 'Passive'], 2, options, seed=3))
+    assert [(r['game'], r['seed'], r['agents']) for r in records] == [
+        (0, 3, ['Passive', 'Standard']), (1, 4, ['Passive', 'Standard']),
+        (0, 3, ['Standard', 'Passive']), (1, 4, ['Standard', 'Passive'])]
+
+
+def test_paired_tournament(options):
+    result = paired_tournament(['Standard', 'Passive'], 3, options, seed=3)
+    assert paired_tournament(['Standard', 'Passive'], 3, options, seed=3, processes=2) == result
+    assert result['games'] == 6
+    standard = result['agents']['Standard']
+    assert standard['wins'] == 6 and standard['score'] == 1
+    assert standard['stderr'] == 0
+    assert result['agents']['Passive']['score'] == 0
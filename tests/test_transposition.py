@@ -0,0 +1,36 @@
+from risk.transposition import (
+    TranspositionTable, army_bucket, army_key, territory_keys, zobrist_keys, EXACT_ARMIES, ARMY_BUCKETS)
+
+
+def test_army_bucket():
+    assert [army_bucket(a) for a in range(EXACT_ARMIES)] == list(range(EXACT_ARMIES))
+    assert army_bucket(EXACT_ARMIES) == army_bucket(2 * EXACT_ARMIES - 1)
+    assert army_bucket(2 * EXACT_ARMIES) == army_bucket(EXACT_ARMIES) + 1
+    assert army_bucket(10 ** 12) == ARMY_BUCKETS - 1
+
+
+def test_zobrist_keys():
+    owner_keys, army_keys = zobrist_keys(42)
+    assert owner_keys.shape[0] == army_keys.shape[0] == 42
+    assert (zobrist_keys(42)[0] == owner_keys).all()
+    assert len(set(owner_keys.flatten().tolist())) == owner_keys.size
+
+
+def test_army_key():
+    key = territory_keys(42)[0]
+    keys = [army_key(key, armies) for armies in range(1000)]
+    assert len(set(keys)) == len(keys)
+    assert all(0 <= k < 1 << 64 for k in keys)
+    assert army_key(territory_keys(42)[1], 5) != army_key(key, 5)
+
+
+def test_transposition_table():
+    table = TranspositionTable(max_entries=2)
+    table.store(1, 'a')
+    table.store(2, 'b')
+    assert table.get(1) == 'a'
+    table.store(3, 'c')  # 2 is least recently used
+    assert 2 not in table
+    assert table.get(2) is None
+    assert len(table) == 2
+    assert (table.hits, table.misses) == (1, 1)